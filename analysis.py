@@ -1,32 +1,578 @@
+import os
+
+# nx-cugraph (якщо встановлено) зчитує цю змінну під час імпорту NetworkX
+os.environ.setdefault("NX_CUGRAPH_AUTOCONFIG", "True")
+
 import networkx as nx
+import numpy as np
 import pandas as pd
 import random
+import pickle
+import hashlib
+import tempfile
+import threading
 import networkx.algorithms.community as nx_comm 
 import networkx.algorithms.flow as nx_flow
-from collections import defaultdict
+from scipy.sparse.csgraph import connected_components
+from dataclasses import dataclass, field
+
+try:
+    from numba import njit, prange, get_num_threads
+    _NUMBA = True
+except ImportError:
+    # Numba необов'язкова: без неї ядра виконуються як звичайний Python
+    _NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Залишкова мережа для Max-Flow спільна для всіх запитів, а Callback-и Dash
+# можуть виконуватись паралельно в різних потоках
+_RESIDUAL_LOCK = threading.Lock()
+
+# Центральність за посередництвом оцінюється за вибіркою _BC_SAMPLES вузлів-джерел:
+# для Топ-10 цього досить. Графи, менші за _BC_EXACT_MAX_NODES, рахуються точно (усі джерела)
+_BC_SAMPLES = 1000
+_BC_EXACT_MAX_NODES = 2000
+
+# Версія формату кешу GraphBundle на диску: збільшувати при зміні полів GraphBundle,
+# щоб старий кеш не завантажувався у новий код
+_BUNDLE_CACHE_VERSION = 9
+
+try:
+    import nx_cugraph  # noqa: F401
+    # Backend-диспетчеризація NetworkX 3.x: той самий виклик, але на GPU.
+    # nx-cugraph рахує лише незважену центральність, тож зважений режим
+    # іде ланцюжком CPU-бекендів
+    _BC_BACKEND = {'backend': 'cugraph'}
+except ImportError:
+    _BC_BACKEND = {}
+
+try:
+    import networkit as nk
+except ImportError:
+    nk = None
+
+try:
+    import igraph as ig
+except ImportError:
+    ig = None
+
+try:
+    import leidenalg
+except ImportError:
+    leidenalg = None
 
 # --- ДОПОМІЖНІ ФУНКЦІЇ ---
 
-def _parse_voltage(v_str):
+def _parse_voltages(v_strs):
+    """
+    Безпечний парсинг рядків напруги для всіх ребер одразу (рядкові операції pandas).
+    Вхідні дані можуть бути '380000' або '380000;110000' (кілька ліній):
+    береться максимальне значення. Порожній рядок, нечислова частина або
+    число поза межами int32 дають 0.
+    
+    @param v_strs (list): Рядки атрибуту 'voltage' (можуть бути None).
+    @return (np.ndarray): Масив int32 з максимальною напругою для кожного рядка.
+    """
+    parts = pd.Series(v_strs, dtype=object).fillna('').str.split(';').explode().str.strip()
+    is_int = parts.str.fullmatch(r'[+-]?\d+').fillna(False).astype(bool)
+    values = pd.to_numeric(parts.where(is_int), errors='coerce')
+    # Завелике число не вміщується в int32 - вважаємо його пошкодженим
+    is_int &= values.abs() <= np.iinfo(np.int32).max
+    
+    # Хоча б одне пошкоджене значення у рядку - весь рядок дає 0
+    all_valid = is_int.groupby(level=0).all()
+    max_v = values.groupby(level=0).max().where(all_valid, 0).fillna(0)
+    return max_v.to_numpy(dtype=np.int32)
+
+def _voltage_category(v):
+    """
+    Категорія напруги ЛЕП або вузла:
+    0 - 380кВ+, 1 - 220кВ, 2 - 110кВ, 3 - Інше (<110кВ).
+    
+    @param v (np.ndarray): Напруга у вольтах.
+    @return (np.ndarray): Коди категорій (int8).
+    """
+    return np.select([v >= 380000, v >= 220000, v >= 110000], [0, 1, 2], default=3).astype(np.int8)
+
+def _igraph(bundle):
+    """
+    Неорієнтований igraph-граф з тими самими номерами вузлів і ребер, що й у
+    масивах GraphBundle. Будується з масивів ребер один раз і зберігається в bundle.
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @return (ig.Graph): Граф igraph.
+    """
+    if bundle.ig_graph is None:
+        bundle.ig_graph = ig.Graph(n=len(bundle.node_ids), edges=np.column_stack([bundle.edge_src, bundle.edge_dst]), directed=False)
+    return bundle.ig_graph
+
+def _betweenness(bundle, weight=None):
+    """
+    Апроксимована центральність за посередництвом (вибірка k=_BC_SAMPLES вузлів-джерел;
+    для графів до _BC_EXACT_MAX_NODES вузлів - точна). Бекенд обирається за наявністю бібліотек:
+    nx-cugraph (GPU, лише без ваги) -> Numba (JIT по CSR-масивах) -> NetworkX (CPU).
+    Ядро Numba повторює NetworkX і при ЛЕП нульової довжини (рівні шляхи),
+    тож рейтинг не залежить від встановлених бібліотек.
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param weight (str): Назва атрибуту ваги ребра ('weight') або None.
+    @return (dict): Словник {node_id: centrality_score}.
+    """
+    G = bundle.G
+    n = len(bundle.node_ids)
+    # k = n - усі вузли є джерелами, і вибіркова формула дає точний результат
+    k = n if n < _BC_EXACT_MAX_NODES else _BC_SAMPLES
+    if _BC_BACKEND and weight is None:
+        return nx.betweenness_centrality(G, k=k if k < n else None, normalized=True, **_BC_BACKEND)
+    if _NUMBA:
+        return _betweenness_numba(bundle, weight, k)
+    
+    # Вибірка з k вузлів-джерел для прискорення:
+    # повний розрахунок на ~9k вузлів зайняв би години.
+    return nx.betweenness_centrality(G, k=k if k < n else None, normalized=True, weight=weight)
+
+def _betweenness_numba(bundle, weight=None, k=_BC_SAMPLES):
+    """
+    Та сама вибіркова оцінка (k вузлів-джерел) JIT-ядром Numba
+    (_brandes_sampled) прямо по CSR-масивам GraphBundle.
+    Вага ребра береться з масиву edge_weight (атрибут 'weight' графа).
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param weight (str): 'weight' для зваженої центральності або None.
+    @param k (int): Кількість вузлів-джерел у вибірці.
+    @return (dict): Словник {node_id: centrality_score}.
+    """
+    n = len(bundle.node_ids)
+    k = min(k, n)
+    sources = np.array(random.sample(range(n), k), dtype=np.int64)
+    # Вага для кожного запису CSR (ребро у напрямку від вузла до сусіда)
+    weights = bundle.edge_weight[bundle.adj_edge] if weight is not None else np.empty(0)
+    
+    centrality = _brandes_sampled(bundle.indptr, bundle.indices, weights, weight is not None,
+                                  sources, min(get_num_threads(), k))
+    
+    # Нормування як у NetworkX для вибірки k джерел без кінцевих вузлів:
+    # вузол-джерело не може бути посередником у власних шляхах
+    if n > 2 and k > 1:
+        scale = np.full(n, 1 / (k * (n - 2)))
+        scale[sources] = 1 / ((k - 1) * (n - 2))
+        centrality *= scale
+    return dict(zip(bundle.node_ids.tolist(), centrality.tolist()))
+
+def file_digest(path):
+    """
+    Хеш вмісту файлу (BLAKE2b): не змінюється при копіюванні чи git checkout,
+    на відміну від часу зміни файлу.
+    @param path (str): Шлях до файлу.
+    @return (str): Шістнадцятковий хеш (16 символів).
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_file_atomic(path, data):
+    """
+    Атомарно записує файл кешу: дані пишуться у тимчасовий файл поруч і
+    підміняють старий файл одним os.replace. Перерваний запис чи паралельний
+    процес ніколи не бачать наполовину записаний файл.
+    @param path (str): Шлях до файлу.
+    @param data (bytes): Вміст файлу.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Не залишаємо недописаний тимчасовий файл
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _safe_float(value, default=np.nan):
     """
-    Допоміжна функція для безпечного парсингу рядків напруги.
-    Вхідні дані можуть бути '380000' або '380000;110000' (кілька ліній).
+    Безпечно конвертує рядковий атрибут (координата, довжина) у float.
     
-    @param v_str (str): Рядок з атрибуту 'voltage'.
-    @return (int): Максимальне значення напруги, знайдене у рядку, або 0.
+    @param value (str): Значення атрибуту з .graphml.
+    @param default (float): Значення, якщо дані відсутні або пошкоджені.
+    @return (float): Число або default.
     """
-    if not v_str: 
-        return 0
-    try: 
-        # Розділяємо рядок по ';' і беремо максимальне числове значення
-        return max(int(v) for v in v_str.split(';'))
+    if not value:
+        return default
+    try:
+        return float(value)
     except (ValueError, TypeError):
-        # Повертаємо 0, якщо дані пошкоджені або не є числом
-        return 0
+        return default
+
+@njit(cache=True)
+def _find(parent, i):
+    """Пошук кореня у системі неперетинних множин (зі стисненням шляху)."""
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+@njit(cache=True)
+def _attach_node(u, indptr, indices, alive, parent, size):
+    """
+    "Повертає" вузол u у граф: об'єднує його з усіма живими сусідами.
+    @return (int): Розмір компонента, до якого тепер належить u.
+    """
+    alive[u] = True
+    root = _find(parent, u)
+    for k in range(indptr[u], indptr[u + 1]):
+        v = indices[k]
+        if alive[v]:
+            other = _find(parent, v)
+            if other != root:
+                # Приєднуємо менше дерево до більшого
+                if size[root] < size[other]:
+                    root, other = other, root
+                parent[other] = root
+                size[root] += size[other]
+    return size[root]
+
+@njit(cache=True)
+def _robustness_sizes(indptr, indices, attack_order):
+    """
+    Розмір найбільшого компонента після кожного кроку атаки.
+    
+    Замість повторного пошуку компонент після кожного видалення
+    рахуємо "у зворотному часі": стартуємо з графа після всієї атаки
+    і додаємо вузли назад, підтримуючи union-find з розмірами.
+    
+    @param attack_order (np.ndarray): Індекси вузлів у порядку атаки
+        (-1 - крок без змін, напр. вузол вже видалено).
+    @return (np.ndarray): Розміри найбільшого компонента для кроків 1..K.
+    """
+    n = len(indptr) - 1
+    parent = np.arange(n)
+    size = np.ones(n, np.int64)
+    alive = np.zeros(n, np.bool_)
+    attacked = np.zeros(n, np.bool_)
+    for u in attack_order:
+        if u >= 0:
+            attacked[u] = True
+    
+    # Стан після останнього кроку атаки: живі всі не атаковані вузли
+    max_size = 0
+    for u in range(n):
+        if not attacked[u]:
+            s = _attach_node(u, indptr, indices, alive, parent, size)
+            if s > max_size:
+                max_size = s
+    
+    # Йдемо назад по атаці, повертаючи вузли у граф
+    steps = len(attack_order)
+    sizes = np.empty(steps, np.int64)
+    for step in range(steps - 1, -1, -1):
+        sizes[step] = max_size
+        u = attack_order[step]
+        if u >= 0:
+            s = _attach_node(u, indptr, indices, alive, parent, size)
+            if s > max_size:
+                max_size = s
+    return sizes
+
+@njit(cache=True, parallel=True)
+def _robustness_curves(indptr, indices, attack_orders):
+    """
+    _robustness_sizes для кількох незалежних атак одночасно (prange по атаках).
+    
+    @param attack_orders (np.ndarray): Матриця (кількість атак x кроки),
+        коротші атаки доповнені -1.
+    @return (np.ndarray): Матриця розмірів найбільшого компонента.
+    """
+    out = np.empty(attack_orders.shape, np.int64)
+    for a in prange(attack_orders.shape[0]):
+        out[a] = _robustness_sizes(indptr, indices, attack_orders[a])
+    return out
+
+@njit(cache=True)
+def _hub_voltage_hist(indptr, adj_edge, edge_cat, hub_idx):
+    """
+    Гістограма напруги ЛЕП для кожного хаба.
+    Стовпці - коди edge_cat: 0 - 380кВ+, 1 - 220кВ, 2 - 110кВ, 3 - Інше.
+    
+    @param hub_idx (np.ndarray): Індекси вузлів-хабів.
+    @return (np.ndarray): Матриця (кількість хабів x 4) з кількістю ЛЕП.
+    """
+    out = np.zeros((len(hub_idx), 4), np.int64)
+    for h in range(len(hub_idx)):
+        i = hub_idx[h]
+        for k in range(indptr[i], indptr[i + 1]):
+            out[h, edge_cat[adj_edge[k]]] += 1
+    return out
+
+@njit(cache=True)
+def _heap_push(h_dist, h_cnt, h_pred, h_node, size, dist, cnt, pred, node):
+    """Додає запис у бінарну купу (впорядкування за (dist, cnt), як heapq у NetworkX)."""
+    i = size
+    while i > 0:
+        parent = (i - 1) // 2
+        if h_dist[parent] < dist or (h_dist[parent] == dist and h_cnt[parent] < cnt):
+            break
+        h_dist[i] = h_dist[parent]; h_cnt[i] = h_cnt[parent]
+        h_pred[i] = h_pred[parent]; h_node[i] = h_node[parent]
+        i = parent
+    h_dist[i] = dist; h_cnt[i] = cnt; h_pred[i] = pred; h_node[i] = node
+    return size + 1
+
+@njit(cache=True)
+def _heap_pop(h_dist, h_cnt, h_pred, h_node, size):
+    """Прибирає вершину купи (її треба прочитати до виклику). @return (int): Новий розмір."""
+    size -= 1
+    dist = h_dist[size]; cnt = h_cnt[size]; pred = h_pred[size]; node = h_node[size]
+    i = 0
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        right = child + 1
+        if right < size and (h_dist[right] < h_dist[child] or (h_dist[right] == h_dist[child] and h_cnt[right] < h_cnt[child])):
+            child = right
+        if dist < h_dist[child] or (dist == h_dist[child] and cnt < h_cnt[child]):
+            break
+        h_dist[i] = h_dist[child]; h_cnt[i] = h_cnt[child]
+        h_pred[i] = h_pred[child]; h_node[i] = h_node[child]
+        i = child
+    h_dist[i] = dist; h_cnt[i] = cnt; h_pred[i] = pred; h_node[i] = node
+    return size
+
+@njit(cache=True)
+def _sssp_bfs(s, indptr, indices, order, pred, pred_count, sigma, dist):
+    """
+    Найкоротші шляхи від s без ваг (BFS), як _single_source_shortest_path_basic
+    у NetworkX. Попередники вузла w - pred[indptr[w] : indptr[w] + pred_count[w]].
+    @return (int): Кількість досяжних вузлів (заповнена частина order).
+    """
+    sigma[:] = 0.0
+    dist[:] = -1
+    pred_count[:] = 0
+    sigma[s] = 1.0
+    dist[s] = 0
+    order[0] = s
+    head, tail = 0, 1
+    while head < tail:
+        v = order[head]
+        head += 1
+        for k in range(indptr[v], indptr[v + 1]):
+            w = indices[k]
+            if dist[w] < 0:
+                order[tail] = w
+                tail += 1
+                dist[w] = dist[v] + 1
+            if dist[w] == dist[v] + 1:
+                sigma[w] += sigma[v]
+                pred[indptr[w] + pred_count[w]] = v
+                pred_count[w] += 1
+    return tail
+
+@njit(cache=True)
+def _sssp_dijkstra(s, indptr, indices, weights, order, pred, pred_count, sigma, seen, done,
+                   h_dist, h_cnt, h_pred, h_node):
+    """
+    Найкоротші шляхи від s з вагами (Dijkstra), крок-у-крок як
+    _single_source_dijkstra_path_basic у NetworkX (включно з рівними шляхами).
+    Сусіди в CSR йдуть у порядку G[v] (див. build_graph_bundle), тож і при ребрах
+    нульової ваги рівні шляхи розв'язуються так само, як у NetworkX.
+    @return (int): Кількість досяжних вузлів (заповнена частина order).
+    """
+    sigma[:] = 0.0
+    seen[:] = np.inf
+    done[:] = False
+    pred_count[:] = 0
+    sigma[s] = 1.0
+    seen[s] = 0.0
+    size = _heap_push(h_dist, h_cnt, h_pred, h_node, 0, 0.0, 0, s, s)
+    cnt = 1
+    n_done = 0
+    while size > 0:
+        d = h_dist[0]; p = h_pred[0]; v = h_node[0]
+        size = _heap_pop(h_dist, h_cnt, h_pred, h_node, size)
+        if done[v]:
+            continue
+        sigma[v] += sigma[p]
+        order[n_done] = v
+        n_done += 1
+        done[v] = True
+        for k in range(indptr[v], indptr[v + 1]):
+            w = indices[k]
+            vw_dist = d + weights[k]
+            if not done[w] and vw_dist < seen[w]:
+                seen[w] = vw_dist
+                size = _heap_push(h_dist, h_cnt, h_pred, h_node, size, vw_dist, cnt, v, w)
+                cnt += 1
+                sigma[w] = 0.0
+                pred[indptr[w]] = v
+                pred_count[w] = 1
+            elif vw_dist == seen[w]:
+                sigma[w] += sigma[v]
+                pred[indptr[w] + pred_count[w]] = v
+                pred_count[w] += 1
+    return n_done
+
+@njit(cache=True, parallel=True)
+def _brandes_sampled(indptr, indices, weights, weighted, sources, n_chunks):
+    """
+    Алгоритм Brandes для вибірки вузлів-джерел по CSR-масивах (без нормування,
+    кожна пара (s, t) рахується в обох напрямках, як у NetworkX до _rescale).
+    Джерела діляться на n_chunks частин, що рахуються паралельно (prange),
+    кожна частина має власні робочі масиви та рядок результату.
+    
+    @param weights (np.ndarray): Вага кожного запису indices (для weighted=True).
+    @param sources (np.ndarray): Індекси вузлів-джерел.
+    @return (np.ndarray): Ненормована центральність кожного вузла.
+    """
+    n = len(indptr) - 1
+    m2 = len(indices)
+    partial = np.zeros((n_chunks, n))
+    for c in prange(n_chunks):
+        order = np.empty(n, np.int64)
+        pred = np.empty(m2, np.int64)
+        pred_count = np.zeros(n, np.int64)
+        sigma = np.zeros(n)
+        delta = np.zeros(n)
+        dist = np.empty(n, np.int64)
+        seen = np.empty(n)
+        done = np.zeros(n, np.bool_)
+        h_dist = np.empty(m2 + 1)
+        h_cnt = np.empty(m2 + 1, np.int64)
+        h_pred = np.empty(m2 + 1, np.int64)
+        h_node = np.empty(m2 + 1, np.int64)
+        bc = partial[c]
+        for t in range(c, len(sources), n_chunks):
+            s = sources[t]
+            if weighted:
+                n_reached = _sssp_dijkstra(s, indptr, indices, weights, order, pred, pred_count, sigma,
+                                           seen, done, h_dist, h_cnt, h_pred, h_node)
+            else:
+                n_reached = _sssp_bfs(s, indptr, indices, order, pred, pred_count, sigma, dist)
+            # Накопичення залежностей у зворотному порядку відвідування
+            for i in range(n_reached):
+                delta[order[i]] = 0.0
+            for i in range(n_reached - 1, -1, -1):
+                w = order[i]
+                coeff = (1.0 + delta[w]) / sigma[w]
+                for j in range(indptr[w], indptr[w] + pred_count[w]):
+                    v = pred[j]
+                    delta[v] += sigma[v] * coeff
+                if w != s:
+                    bc[w] += delta[w]
+    return partial.sum(axis=0)
 
 # --- 1. ФУНКЦІЯ ЗАВАНТАЖЕННЯ ---
 
-def load_and_prepare_data(file_name):
+@dataclass(eq=False)
+class GraphBundle:
+    """
+    Робочий граф разом з його "плоским" представленням у масивах numpy.
+    
+    Масиви будуються один раз при завантаженні і використовуються всіма
+    аналізами замість повторних обходів словників NetworkX.
+    Порівнюється та хешується за ідентичністю (eq=False), тож може бути
+    ключем кешу: новий граф = новий об'єкт = новий ключ.
+    Вузли пронумеровані 0..N-1 у порядку G.nodes(),
+    ребра - 0..M-1 у порядку G.edges().
+    """
+    G: nx.Graph              # Граф NetworkX (з оригінальними ID вузлів)
+    node_ids: np.ndarray     # ID вузла за його індексом
+    index: dict              # {node_id: індекс}
+    indptr: np.ndarray       # CSR: сусіди вузла i - indices[indptr[i]:indptr[i+1]]
+    indices: np.ndarray      # CSR: індекси сусідів (кожне ребро в обидва боки)
+    adj_edge: np.ndarray     # CSR: номер ребра для кожного запису в indices
+    edge_src: np.ndarray     # Індекс першого вузла ребра
+    edge_dst: np.ndarray     # Індекс другого вузла ребра
+    edge_v: np.ndarray       # Максимальна напруга ребра (0, якщо невідома)
+    edge_cat: np.ndarray     # Категорія напруги ребра, int8 (див. _voltage_category)
+    edge_voltage_str: np.ndarray  # Рядок напруги як у файлі (для таблиць)
+    edge_len: np.ndarray     # Довжина ЛЕП у метрах (NaN, якщо невідома)
+    edge_capacity: np.ndarray  # Пропускна здатність ЛЕП (~ 1 / Довжина)
+    edge_weight: np.ndarray  # Вага ЛЕП для зваженої центральності (= Довжина, 1.0 якщо невідома)
+    node_v: np.ndarray       # Максимальна напруга ЛЕП, що підходять до вузла (0, якщо невідома)
+    lat: np.ndarray          # Широта вузла, float32 (NaN, якщо невідома)
+    lon: np.ndarray          # Довгота вузла, float32 (NaN, якщо невідома)
+    residual: nx.DiGraph = field(default=None, repr=False)  # Залишкова мережа Max-Flow (будується при першому запиті)
+    ig_graph: object = field(default=None, repr=False)  # Копія графа для igraph (див. _igraph, будується при першому запиті)
+
+def build_graph_bundle(G):
+    """
+    Будує GraphBundle для графа: CSR-суміжність та атрибути вузлів і ребер
+    у вигляді масивів numpy.
+    Увага: граф G змінюється на місці - сирі атрибути ребер (voltage, lengthm, ...)
+    замінюються на 'capacity' та 'weight'. Якщо вихідний граф ще потрібен,
+    передавайте копію (G.copy()).
+    
+    @param G (nx.Graph): Робочий граф (стає bundle.G і змінюється на місці).
+    @return (GraphBundle): Граф разом з масивами.
+    """
+    node_ids = np.empty(G.number_of_nodes(), dtype=object)
+    node_ids[:] = list(G.nodes())
+    index = {node: i for i, node in enumerate(node_ids)}
+    n = len(node_ids)
+    m = G.number_of_edges()
+    
+    edge_src = np.fromiter((index[u] for u, v in G.edges()), dtype=np.int32, count=m)
+    edge_dst = np.fromiter((index[v] for u, v in G.edges()), dtype=np.int32, count=m)
+    edge_voltage_str = np.empty(m, dtype=object)
+    edge_voltage_str[:] = [d.get('voltage', '0') for _, _, d in G.edges(data=True)]
+    edge_v = _parse_voltages(edge_voltage_str)
+    edge_cat = _voltage_category(edge_v)
+    edge_len = np.fromiter((_safe_float(d.get('lengthm')) for _, _, d in G.edges(data=True)), dtype=np.float64, count=m)
+    
+    # Припускаємо, що пропускна здатність ~ 1 / Довжина (коротші лінії = кращі).
+    # Для невідомої або нульової довжини - стандартна capacity 1.0
+    with np.errstate(divide='ignore'):
+        edge_capacity = np.where(np.isnan(edge_len) | (edge_len == 0), 1.0, 1.0 / edge_len)
+    # Вага для зваженої центральності = довжина ЛЕП (1.0, якщо даних немає)
+    edge_weight = np.where(np.isnan(edge_len), 1.0, edge_len)
+    
+    # Сирі атрибути ребер (рядки з .graphml) вже перенесені у масиви -
+    # у графі лишаємо тільки capacity (Max-Flow) та weight (центральність),
+    # щоб не тримати їх у пам'яті двічі. Записуємо їх один раз,
+    # щоб не копіювати граф на кожен запит
+    for (_, _, data), capacity, weight in zip(G.edges(data=True), edge_capacity.tolist(), edge_weight.tolist()):
+        data.clear()
+        data['capacity'] = capacity
+        data['weight'] = weight
+    
+    # Макс. напруга вузла = максимум по всіх ребрах, що до нього підходять
+    node_v = np.zeros(n, dtype=np.int32)
+    np.maximum.at(node_v, edge_src, edge_v)
+    np.maximum.at(node_v, edge_dst, edge_v)
+    
+    # Координати - один прохід по вузлах. float32 (~1 м точності) достатньо для мапи:
+    # масиви вдвічі менші і без перетворень ідуть у Plotly бінарним масивом
+    coords = np.array([(_safe_float(d.get('lat')), _safe_float(d.get('lon'))) for _, d in G.nodes(data=True)],
+                      dtype=np.float32).reshape(n, 2)
+    lat, lon = np.ascontiguousarray(coords.T)
+    
+    # CSR: неорієнтований граф, тому кожне ребро потрібне у списках обох вузлів.
+    # Сусіди йдуть у порядку G[v], як їх обходить NetworkX: від цього порядку залежить,
+    # як Dijkstra розв'язує рівні шляхи (напр. через ЛЕП нульової довжини)
+    edge_id = {}
+    for i, (u, v) in enumerate(G.edges()):
+        edge_id[u, v] = edge_id[v, u] = i
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(G[u]) for u in node_ids), dtype=np.int64, count=n), out=indptr[1:])
+    indices = np.fromiter((index[w] for u in node_ids for w in G[u]), dtype=np.int32, count=indptr[-1])
+    adj_edge = np.fromiter((edge_id[u, w] for u in node_ids for w in G[u]), dtype=np.int64, count=indptr[-1])
+    
+    return GraphBundle(G=G, node_ids=node_ids, index=index,
+                       indptr=indptr, indices=indices, adj_edge=adj_edge,
+                       edge_src=edge_src, edge_dst=edge_dst, edge_v=edge_v, edge_cat=edge_cat, edge_voltage_str=edge_voltage_str, edge_len=edge_len,
+                       edge_capacity=edge_capacity, edge_weight=edge_weight,
+                       node_v=node_v, lat=lat, lon=lon)
+
+def load_and_prepare_data(file_name, source_digest=None):
     """
     Завантажує файл .graphml та готує його до аналізу.
     
@@ -34,105 +580,153 @@ def load_and_prepare_data(file_name):
     зв'язний компонент, оскільки більшість графових алгоритмів
     (centrality, flow) некоректно працюють на незв'язних графах.
     
+    Результат кешується на диску поруч з файлом ('<file_name>.cache.pkl'):
+    наступні запуски пропускають розбір XML, поки не змінився *вміст* .graphml
+    (кеш перевіряється за хешем файлу, а не за часом зміни).
+    
     @param file_name (str): Шлях до файлу .graphml.
-    @return (nx.Graph): Очищений, зв'язний граф NetworkX.
+    @param source_digest (str): Хеш вмісту файлу (file_digest), якщо вже порахований.
+    @return (GraphBundle): Очищений, зв'язний граф NetworkX разом з його масивами.
     """
+    cache_path = f"{file_name}.cache.pkl"
+    if source_digest is None:
+        source_digest = file_digest(file_name)
+    bundle = _load_bundle_cache(cache_path, source_digest)
+    if bundle is not None:
+        print(f"  ...граф взято з кешу '{cache_path}'")
+        return bundle
+    
     # Завантажуємо повний граф з усіма компонентами
     G_full = nx.read_graphml(file_name)
     
-    # Знаходимо всі окремі компоненти (острови)
-    components = sorted(nx.connected_components(G_full), key=len, reverse=True)
+    # Знаходимо всі окремі компоненти (острови) - реалізація SciPy на CSR-матриці
+    nodes = np.empty(G_full.number_of_nodes(), dtype=object)
+    nodes[:] = list(G_full.nodes())
+    adjacency = nx.to_scipy_sparse_array(G_full, nodelist=nodes, weight=None, format='csr')
+    _, labels = connected_components(adjacency, directed=False)
     
     # Виділяємо найбільший компонент (нашу основну мережу)
-    G_main = G_full.subgraph(components[0]).copy()
+    largest = np.bincount(labels).argmax()
+    G_main = G_full.subgraph(nodes[labels == largest]).copy()
+    
+    bundle = build_graph_bundle(G_main)
+    _save_bundle_cache(cache_path, bundle, source_digest)
+    return bundle
+
+def _load_bundle_cache(cache_path, source_digest):
+    """
+    Читає GraphBundle з кешу, якщо кеш побудовано з того самого вмісту файлу.
     
-    return G_main
+    @param cache_path (str): Шлях до файлу кешу.
+    @param source_digest (str): Хеш вмісту вихідного .graphml (file_digest).
+    @return (GraphBundle): Граф з кешу або None, якщо кеш відсутній чи застарів.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            version, digest, bundle = pickle.load(f)
+    except Exception:
+        # Пошкоджений кеш або кеш від несумісної версії бібліотек - просто перебудовуємо
+        return None
+    return bundle if version == _BUNDLE_CACHE_VERSION and digest == source_digest else None
+
+def _save_bundle_cache(cache_path, bundle, source_digest):
+    """
+    Зберігає GraphBundle у кеш. Помилка запису не зупиняє застосунок.
+    
+    @param cache_path (str): Шлях до файлу кешу.
+    @param bundle (GraphBundle): Щойно побудований граф з масивами.
+    @param source_digest (str): Хеш вмісту вихідного .graphml (file_digest).
+    """
+    try:
+        write_file_atomic(cache_path, pickle.dumps((_BUNDLE_CACHE_VERSION, source_digest, bundle), protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        print(f"  ...не вдалося зберегти кеш графа: {e}")
 
 # --- 2. АНАЛІЗ: ХАБИ І ТУПИКИ ---
 
-def get_degree_analysis(G):
+def get_degree_analysis(bundle):
     """
     Проводить аналіз ступенів (Degree Centrality) для всіх вузлів.
     Ідентифікує вузли-хаби (високий ступінь) та "тупикові" вузли (ступінь 1).
     
-    @param G (nx.Graph): Робочий граф.
-    @return (list, list):
-        1. full_sorted_degree: Повний список пар (node_id, degree), відсортований.
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @return (np.ndarray, list):
+        1. full_sorted_degree: Структурований масив з полями 'id' та 'deg',
+           відсортований за спаданням ступеня (рядки розпаковуються як пари (node_id, degree)).
         2. vulnerable_nodes: Список ID "тупикових" вузлів (ступінь == 1).
     """
-    # 1. Отримуємо повний список (node_id, degree) і сортуємо
-    full_sorted_degree = sorted(G.degree(), key=lambda item: item[1], reverse=True)
+    # Ступінь вузла = довжина його рядка у CSR (один прохід, без G.degree())
+    degrees = np.diff(bundle.indptr)
+    
+    # 1. Повний список (node_id, degree), відсортований за спаданням.
+    # Стабільне сортування зберігає порядок G.nodes() для рівних ступенів, як і sorted()
+    order = np.argsort(-degrees, kind='stable')
+    sorted_ids = bundle.node_ids[order].astype(str)
+    full_sorted_degree = np.empty(len(order), dtype=[('id', sorted_ids.dtype), ('deg', np.int32)])
+    full_sorted_degree['id'] = sorted_ids
+    full_sorted_degree['deg'] = degrees[order]
     
     # 2. Знаходимо "тупикові" вузли
-    vulnerable_nodes = [node for node, degree in G.degree() if degree == 1]
+    vulnerable_nodes = bundle.node_ids[degrees == 1].tolist()
     
     return full_sorted_degree, vulnerable_nodes
 
 # --- 3. АНАЛІЗ: КРИТИЧНІСТЬ (НЕЗВАЖЕНА) ---
 
-def get_centrality_analysis(G):
+def get_centrality_analysis(bundle):
     """
     Розраховує незважену центральність за посередництвом (Betweenness Centrality).
     Визначає вузли, що найчастіше лежать на *топологічно* найкоротших шляхах.
     
-    @param G (nx.Graph): Робочий граф.
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @return (list): Відсортований список пар (node_id, centrality_score).
     """
     print("  ...рахую не-зважену центральність (~30 сек)...")
     
-    # k=1000 використовує апроксимацію (вибірку з 1000 вузлів) для прискорення.
-    # Повний розрахунок на ~9k вузлів зайняв би години.
-    centrality = nx.betweenness_centrality(G, k=1000, normalized=True)
+    centrality = _betweenness(bundle)
     
     return sorted(centrality.items(), key=lambda item: item[1], reverse=True)
 
 # --- 4. АНАЛІЗ: КРИТИЧНІСТЬ (ЗВАЖЕНА) ---
 
-def get_weighted_centrality_analysis(G):
+def get_weighted_centrality_analysis(bundle):
     """
     Розраховує зважену центральність за посередництвом (Betweenness Centrality).
     Використовує 'lengthm' (довжину ЛЕП) як вагу.
     Шукає вузли, що лежать на *фізично* найкоротших шляхах (в метрах).
     
-    @param G (nx.Graph): Робочий граф.
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @return (list): Відсортований список пар (node_id, centrality_score).
     """
-    G_weighted = G.copy()
-    
-    # Призначаємо вагу 'weight' кожному ребру на основі 'lengthm'
-    for u, v, data in G_weighted.edges(data=True):
-        length_str = data.get('lengthm')
-        try:
-            # Конвертуємо довжину (рядок) у число
-            data['weight'] = float(length_str)
-        except (ValueError, TypeError, AttributeError):
-            # Якщо даних немає або вони пошкоджені, ставимо вагу за замовчуванням
-            data['weight'] = 1.0
-            
+    # Вага 'weight' вже записана на ребрах при завантаженні (build_graph_bundle),
+    # тож граф не копіюємо
     print("  ...рахую зважену центральність (~30 сек)...")
     
     # Запускаємо той самий алгоритм, але вказуємо 'weight'
-    centrality = nx.betweenness_centrality(G_weighted, k=1000, normalized=True, weight='weight')
+    centrality = _betweenness(bundle, weight='weight')
     
     return sorted(centrality.items(), key=lambda item: item[1], reverse=True)
 
 # --- 5. ДАНІ ДЛЯ ГІСТОГРАМИ ---
 
-def get_histogram_data(G):
+def get_histogram_data(bundle):
     """
     Отримує дані для побудови гістограми розподілу ступенів.
     
-    @param G (nx.Graph): Робочий граф.
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @return (pd.DataFrame): DataFrame з колонками ['Ступінь', 'Кількість вузлів'].
     """
     print("  ...готую дані для гістограми...")
     
-    # nx.degree_histogram() повертає список [0, 1436, 4000, ...], 
-    # де індекс - це ступінь, а значення - кількість.
-    hist_list = nx.degree_histogram(G)
+    # np.bincount по ступенях з CSR повертає масив [0, 1436, 4000, ...],
+    # де індекс - це ступінь, а значення - кількість (як nx.degree_histogram)
+    counts = np.bincount(np.diff(bundle.indptr))
     
-    # Конвертуємо у DataFrame для зручної роботи в Plotly
-    df = pd.DataFrame({'Ступінь': range(len(hist_list)), 'Кількість вузлів': hist_list})
+    # Конвертуємо у DataFrame для зручної роботи в Plotly (ступінь вміщується в int16)
+    df = pd.DataFrame({'Ступінь': np.arange(len(counts), dtype=np.int16),
+                       'Кількість вузлів': counts.astype(np.int32)})
     
     # Видаляємо ступінь 0, оскільки він не має сенсу (ізольовані вузли ми видалили)
     df = df[df['Ступінь'] > 0] 
@@ -140,110 +734,99 @@ def get_histogram_data(G):
 
 # --- 6. АНАЛІЗ: СТІЙКІСТЬ (РОЗРАХУНОК) ---
 
-def calculate_robustness(G, nodes_to_attack):
+def calculate_robustness(bundle, nodes_to_attack):
     """
     Симулює цілеспрямовану атаку на мережу, послідовно видаляючи
     вузли зі списку 'nodes_to_attack'.
     На кожному кроці розраховує розмір найбільшого зв'язного компонента.
     
-    @param G (nx.Graph): Робочий граф.
+    Розрахунок виконується одним проходом union-find у зворотному
+    порядку (див. _robustness_sizes) по CSR-масивах, граф не змінюється.
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @param nodes_to_attack (list): Відсортований список ID вузлів для атаки.
     @return (pd.DataFrame): DataFrame з кроками атаки та % "живої" мережі.
     """
-    sizes = []
-    # ОБОВ'ЯЗКОВО копіюємо граф, щоб не пошкодити оригінал (G_main)
-    G_copy = G.copy() 
-    initial_size = float(G_copy.number_of_nodes())
-    sizes.append(1.0) # Крок 0: 0 видалено, 100% мережі
+    return calculate_robustness_batch(bundle, [nodes_to_attack])[0]
+
+def calculate_robustness_batch(bundle, attacks):
+    """
+    Те саме, що calculate_robustness, але для кількох атак одним
+    паралельним JIT-викликом (_robustness_curves).
     
-    total = len(nodes_to_attack)
-    for i, node in enumerate(nodes_to_attack):
-        if i % 10 == 0: 
-            print(f"    ...прогрес стійкості: {i}/{total}", end='\r')
-        
-        # Вузол може бути вже видалений, якщо він "відвалився"
-        # разом з іншим компонентом.
-        if node not in G_copy:
-            if sizes: sizes.append(sizes[-1]) # Дублюємо попередній результат
-            continue
-            
-        G_copy.remove_node(node)
-        
-        if G_copy.number_of_nodes() == 0: 
-            sizes.append(0.0) # Мережа повністю знищена
-            continue
-        
-        # Знаходимо найбільший компонент ПІСЛЯ атаки
-        largest_comp_nodes = max(nx.connected_components(G_copy), key=len)
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param attacks (list): Списки ID вузлів для кожної атаки.
+    @return (list): DataFrame з кроками атаки та % "живої" мережі для кожної атаки.
+    """
+    initial_size = float(len(bundle.node_ids))
+    
+    # Переводимо ID у цілі індекси. Вузол може бути відсутнім у графі
+    # або вже видаленим раніше - такий крок нічого не змінює (-1).
+    # Коротші атаки доповнюємо -1 до спільної довжини.
+    attack_orders = np.full((len(attacks), max(map(len, attacks), default=0)), -1, dtype=np.int64)
+    for a, nodes_to_attack in enumerate(attacks):
+        removed = set()
+        for step, node in enumerate(nodes_to_attack):
+            i = bundle.index.get(node)
+            if i is not None and i not in removed:
+                attack_orders[a, step] = i
+                removed.add(i)
+    
+    curves = _robustness_curves(bundle.indptr, bundle.indices, attack_orders)
+    
+    results = []
+    for nodes_to_attack, sizes in zip(attacks, curves):
+        total = len(nodes_to_attack)
+        print(f"    ...прогрес стійкості: {total}/{total} - Завершено.")
         
-        # Записуємо % живої мережі від початкового розміру
-        sizes.append(len(largest_comp_nodes) / initial_size)
+        # Крок 0: 0 видалено, 100% мережі
+        fractions = np.concatenate([[1.0], sizes[:total] / initial_size])
         
-    print(f"    ...прогрес стійкості: {total}/{total} - Завершено.")
-    
-    # Конвертуємо у DataFrame для зручної роботи в Plotly
-    df = pd.DataFrame({'Крок атаки': range(len(sizes)), 'Розмір мережі (%)': [s * 100 for s in sizes]})
-    return df
+        # Конвертуємо у DataFrame для зручної роботи в Plotly
+        results.append(pd.DataFrame({'Крок атаки': range(len(fractions)), 'Розмір мережі (%)': fractions * 100}))
+    return results
 
 # --- 7. ДАНІ ДЛЯ ГЕО-МАПИ (З НАПРУГОЮ) ---
 
-def get_voltage_data_for_nodes(G):
+def get_voltage_data_for_nodes(bundle):
     """
     Аналізує *всі ребра* графа, щоб визначити *максимальну напругу*
     для *кожного вузла*. Потім класифікує вузли за категоріями.
-    Це "важка" операція, що виконується один раз при запуску.
+    Працює над масивами GraphBundle, без Python-циклу по ребрах.
     
-    @param G (nx.Graph): Робочий граф.
-    @return (pd.DataFrame): DataFrame з колонками [lat, lon, text, category, id].
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @return (pd.DataFrame): DataFrame з колонками [lat, lon, max_kv, category, id].
     """
     print("  ...аналізую напругу для 9418 вузлів...")
     
-    # 1. Проходимо по ребрам і знаходимо макс. напругу для вузлів
-    node_voltages = defaultdict(int)
-    for u, v, data in G.edges(data=True):
-        voltage = _parse_voltage(data.get('voltage'))
-        # Оновлюємо макс. напругу для ОБОХ вузлів на ребрі
-        if voltage > node_voltages[u]: node_voltages[u] = voltage
-        if voltage > node_voltages[v]: node_voltages[v] = voltage
-    
-    # 2. Проходимо по вузлам, витягуємо гео-дані та класифікуємо
-    node_data = {'lat': [], 'lon': [], 'text': [], 'category': [], 'id': []}
-    for node, data in G.nodes(data=True):
-        lon_str = data.get('lon'); lat_str = data.get('lat')
-        
-        # Пропускаємо вузли без координат
-        if not (lon_str and lat_str): continue
-        try: 
-            lat = float(lat_str); lon = float(lon_str)
-        except (ValueError, TypeError): 
-            continue
-            
-        max_v = node_voltages[node]
-        
-        # 3. Класифікуємо
-        if max_v >= 380000: category = "380кВ+"
-        elif max_v >= 220000: category = "220кВ"
-        elif max_v >= 110000: category = "110кВ"
-        else: category = "Інше (<110кВ)"
-        
-        # 4. Збираємо дані для DataFrame
-        node_data['lat'].append(lat)
-        node_data['lon'].append(lon)
-        # Готуємо підказку для Plotly
-        node_data['text'].append(f"ID: {node}<br>Max V: {max_v/1000:.0f}кВ<br>Lat: {lat:.4f}<br>Lon: {lon:.4f}")
-        node_data['category'].append(category)
-        node_data['id'].append(node) # Зберігаємо "чистий" ID для Callback
-        
-    return pd.DataFrame(node_data)
+    # 1. Пропускаємо вузли без координат.
+    # Макс. напруга вузла вже порахована при завантаженні (bundle.node_v)
+    has_coords = np.isfinite(bundle.lat) & np.isfinite(bundle.lon)
+    lat = bundle.lat[has_coords]
+    lon = bundle.lon[has_coords]
+    max_v = bundle.node_v[has_coords]
+    ids = bundle.node_ids[has_coords]
+    
+    # 2. Класифікуємо тими ж кодами, що й ребра (edge_cat).
+    # Categorical зберігає лише коди (int8) замість рядка на кожен вузол
+    category = pd.Categorical.from_codes(_voltage_category(max_v),
+                                         categories=["380кВ+", "220кВ", "110кВ", "Інше (<110кВ)"])
+    
+    # 3. Макс. напруга в кВ для підказки: саму підказку Plotly збирає з шаблону
+    # (hovertemplate), тож у браузер не йде готовий рядок на кожен вузол
+    max_kv = np.rint(max_v / 1000).astype(np.int16)
+    
+    # "Чистий" ID зберігаємо для Callback. Координати вже float32 (див. build_graph_bundle)
+    return pd.DataFrame({'lat': lat, 'lon': lon, 'max_kv': max_kv, 'category': category, 'id': ids})
 
 # --- 8. АНАЛІЗ: ВУЗЬКІ МІСЦЯ (MIN-CUT) ---
 
-def get_bottleneck_analysis(G, source_node, sink_node):
+def get_bottleneck_analysis(bundle, source_node, sink_node):
     """
     Розраховує "вузьке місце" (Minimum Cut) між двома вузлами (source, sink).
     Використовує алгоритм Max-Flow / Min-Cut.
     
-    @param G (nx.Graph): Робочий граф.
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @param source_node (str): ID вузла-джерела.
     @param sink_node (str): ID вузла-споживача.
     @return (dict, pd.DataFrame): 
@@ -251,49 +834,34 @@ def get_bottleneck_analysis(G, source_node, sink_node):
         2. df: DataFrame з деталями про ЛЕП у розрізі.
     """
     print(f"  ...рахую вузьке місце: {source_node} -> {sink_node}...")
-    G_capacity = G.copy()
     
-    # Призначаємо "пропускну здатність" (capacity) кожному ребру
-    for u, v, data in G_capacity.edges(data=True):
-        length_str = data.get('lengthm')
-        try:
-            length = float(length_str)
-            if length == 0: 
-                data['capacity'] = 1.0 # Уникаємо ділення на нуль
-            else: 
-                # Припускаємо, що пропускна здатність ~ 1 / Довжина
-                # (коротші лінії = кращі)
-                data['capacity'] = 1.0 / length 
-        except (ValueError, TypeError, AttributeError):
-            data['capacity'] = 1.0 # Стандартна capacity
-            
-    # 1. Головний розрахунок (Max-Flow / Min-Cut)
-    cut_value, partition = nx_flow.minimum_cut(G_capacity, source_node, sink_node, capacity='capacity')
-    
-    reachable, non_reachable = partition
-    
-    # 2. Знаходимо ребра, які перетинають цей розріз
-    bottleneck_edges = nx.edge_boundary(G_capacity, reachable, non_reachable)
-    
-    # 3. Збираємо статистику для KPI-карток
-    bottleneck_data = []
-    min_voltage = float('inf')
-    
-    for u, v in bottleneck_edges:
-        edge_data = G_capacity.edges[u, v]
-        voltage_str = edge_data.get('voltage', '0')
-        voltage_num = _parse_voltage(voltage_str)
-        
-        # Шукаємо "найслабшу ланку" (найнижчу напругу в розрізі)
-        if voltage_num > 0 and voltage_num < min_voltage:
-            min_voltage = voltage_num
-            
-        bottleneck_data.append((f"{u} - {v}", voltage_str, f"{float(edge_data.get('lengthm', 0)):.1f} м"))
-        
-    if min_voltage == float('inf'): 
-        min_voltage = 0
-        
-    df = pd.DataFrame(bottleneck_data, columns=["ЛЕП (Від - До)", "Напруга (V)", "Довжина (м)"])
+    # 1. Головний розрахунок (Max-Flow / Min-Cut): маска вузлів на боці джерела
+    if ig is not None:
+        cut_value, reachable_mask = _min_cut_igraph(bundle, source_node, sink_node)
+    else:
+        cut_value, reachable_mask = _min_cut_networkx(bundle, source_node, sink_node)
+    
+    # 2. Знаходимо ребра, які перетинають цей розріз: кінці ребра лежать по різні боки.
+    # Одна векторна операція над масивами ребер замість nx.edge_boundary
+    src_side = reachable_mask[bundle.edge_src]
+    cut_idx = np.flatnonzero(src_side != reachable_mask[bundle.edge_dst])
+    
+    # Записуємо ЛЕП у напрямку "від джерела до споживача"
+    forward = src_side[cut_idx]
+    from_ids = bundle.node_ids[np.where(forward, bundle.edge_src[cut_idx], bundle.edge_dst[cut_idx])]
+    to_ids = bundle.node_ids[np.where(forward, bundle.edge_dst[cut_idx], bundle.edge_src[cut_idx])]
+    
+    # 3. Збираємо статистику для KPI-карток.
+    # Шукаємо "найслабшу ланку" (найнижчу відому напругу в розрізі)
+    voltages_cut = bundle.edge_v[cut_idx]
+    known_voltages = voltages_cut[voltages_cut > 0]
+    min_voltage = int(known_voltages.min()) if known_voltages.size else 0
+    
+    df = pd.DataFrame({
+        "ЛЕП (Від - До)": [f"{u} - {v}" for u, v in zip(from_ids, to_ids)],
+        "Напруга (V)": bundle.edge_voltage_str[cut_idx],
+        "Довжина (м)": [f"{length:.1f} м" for length in bundle.edge_len[cut_idx].tolist()],
+    })
     
     # Готуємо фінальний словник з KPI
     stats = {
@@ -304,63 +872,119 @@ def get_bottleneck_analysis(G, source_node, sink_node):
     
     return stats, df
 
+def _min_cut_igraph(bundle, source_node, sink_node):
+    """
+    Max-Flow / Min-Cut засобами igraph (push-relabel на C).
+    Розріз той самий, що й у NetworkX: сторона споживача - вузли, з яких
+    ще можна дістатися до sink по ненасичених ребрах залишкової мережі.
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param source_node (str): ID вузла-джерела.
+    @param sink_node (str): ID вузла-споживача.
+    @return (float, np.ndarray): Величина потоку та маска вузлів на боці джерела.
+    """
+    cut = _igraph(bundle).mincut(bundle.index[source_node], bundle.index[sink_node],
+                                 capacity=bundle.edge_capacity.tolist())
+    return cut.value, np.asarray(cut.membership) == 0
+
+def _min_cut_networkx(bundle, source_node, sink_node):
+    """
+    Max-Flow / Min-Cut засобами NetworkX (якщо igraph не встановлено).
+    
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param source_node (str): ID вузла-джерела.
+    @param sink_node (str): ID вузла-споживача.
+    @return (float, np.ndarray): Величина потоку та маска вузлів на боці джерела.
+    """
+    # 'capacity' вже записана на ребрах при завантаженні (build_graph_bundle)
+    G_capacity = bundle.G
+    
+    # Edmonds-Karp на цьому графі помітно швидший за стандартний preflow_push,
+    # а залишкову мережу будуємо один раз і перевикористовуємо між запитами
+    # (алгоритм сам обнуляє в ній потоки перед розрахунком).
+    with _RESIDUAL_LOCK:
+        if bundle.residual is None:
+            bundle.residual = nx_flow.build_residual_network(G_capacity, 'capacity')
+        R = nx_flow.edmonds_karp(G_capacity, source_node, sink_node, capacity='capacity',
+                                 residual=bundle.residual, value_only=True)
+        cut_value = R.graph['flow_value']
+        
+        # Як і nx.minimum_cut: сторона споживача - вузли, з яких ще можна
+        # дістатися до sink по ненасичених ребрах залишкової мережі
+        unsaturated = nx.subgraph_view(R, filter_edge=lambda u, v: R[u][v]['flow'] < R[u][v]['capacity'])
+        non_reachable = nx.ancestors(unsaturated, sink_node) | {sink_node}
+    
+    reachable_mask = np.ones(len(bundle.node_ids), dtype=bool)
+    reachable_mask[[bundle.index[node] for node in non_reachable]] = False
+    return cut_value, reachable_mask
+
 # --- 9. АНАЛІЗ: СПІЛЬНОТИ ---
 
-def get_communities_analysis(G):
+def get_communities_analysis(bundle):
     """
     Виконує кластеризацію мережі (пошук спільнот) за допомогою
-    алгоритму Louvain.
+    алгоритму Leiden (igraph + leidenalg, якщо встановлені) або Louvain:
+    NetworKit PLM (паралельний C++) -> igraph (C) -> NetworkX.
     
-    @param G (nx.Graph): Робочий граф.
+    @param bundle (GraphBundle): Робочий граф з масивами.
     @return (pd.DataFrame, int): 
         1. DataFrame з Топ-15 спільнотами.
         2. Загальна кількість знайдених спільнот.
     """
     print("  ...рахую спільноти...")
     
-    # Алгоритм Louvain - швидкий та ефективний для великих графів
-    communities_sets = nx_comm.louvain_communities(G, seed=42)
-    communities_list = sorted(communities_sets, key=len, reverse=True)
+    # membership[i] - номер спільноти вузла з індексом i.
+    # Спільноти шукаємо за топологією (без ваги), а не за довжиною ЛЕП
+    if ig is not None and leidenalg is not None:
+        # Leiden (igraph, C++) - покращений Louvain: швидший і дає зв'язні спільноти.
+        partition = leidenalg.find_partition(_igraph(bundle), leidenalg.ModularityVertexPartition, seed=42)
+        membership = np.asarray(partition.membership)
+    elif nk is not None:
+        # Louvain у NetworKit (PLM з уточненням), вузли нумеруються в порядку G.nodes()
+        G_nk = nk.nxadapter.nx2nk(bundle.G)
+        membership = np.asarray(nk.community.PLM(G_nk, True).run().getPartition().getVector())
+    elif ig is not None:
+        # Louvain (multilevel) у igraph
+        membership = np.asarray(_igraph(bundle).community_multilevel().membership)
+    else:
+        # Алгоритм Louvain - швидкий та ефективний для великих графів.
+        membership = np.empty(len(bundle.node_ids), dtype=np.int64)
+        for label, community in enumerate(nx_comm.louvain_communities(bundle.G, weight=None, seed=42)):
+            membership[[bundle.index[node] for node in community]] = label
+    
+    # Розміри спільнот за спаданням (одним bincount замість множин вузлів)
+    sizes = np.bincount(membership)
+    sizes = np.sort(sizes[sizes > 0])[::-1]
     
     # Готуємо дані для таблиці (лише Топ-15)
-    community_data = [(f"Спільнота #{i+1}", f"{len(community)} вузлів") for i, community in enumerate(communities_list[:15])]
+    community_data = [(f"Спільнота #{i+1}", f"{size} вузлів") for i, size in enumerate(sizes[:15].tolist())]
     
-    return pd.DataFrame(community_data, columns=["Назва спільноти", "Розмір"]), len(communities_list)
+    return pd.DataFrame(community_data, columns=["Назва спільноти", "Розмір"]), len(sizes)
 
 # --- 10. АНАЛІЗ: СКЛАД ХАБІВ ---
 
-def get_hubs_voltage_composition(G, top_10_hubs_list):
+def get_hubs_voltage_composition(bundle, top_10_hubs_list):
     """
     Аналізує склад ЛЕП (за напругою) для Топ-10 вузлів-хабів.
     
-    @param G (nx.Graph): Робочий граф.
-    @param top_10_hubs_list (list): Список пар (node_id, degree) з Топ-10.
+    @param bundle (GraphBundle): Робочий граф з масивами.
+    @param top_10_hubs_list (np.ndarray): Пари (node_id, degree) з Топ-10
+        (зріз full_sorted_degree або список кортежів).
     @return (pd.DataFrame): DataFrame, готовий для stacked bar chart в Plotly.
     """
     print("  ...аналізую склад Топ-10 Хабів...")
-    hub_composition_data = []
     
-    for hub_id, degree in top_10_hubs_list:
-        # 1. Рахуємо лінії різної напруги для одного хаба
-        counts = {"380кВ+": 0, "220кВ": 0, "110кВ": 0, "Інше": 0}
-        
-        for neighbor in G.neighbors(hub_id):
-            edge_data = G.edges[hub_id, neighbor]
-            max_v = _parse_voltage(edge_data.get('voltage'))
-            
-            # 2. Класифікуємо кожну ЛЕП
-            if max_v >= 380000: counts["380кВ+"] += 1
-            elif max_v >= 220000: counts["220кВ"] += 1
-            elif max_v >= 110000: counts["110кВ"] += 1
-            else: counts["Інше"] += 1
-        
-        # 3. Форматуємо дані для "stacked bar chart"
-        for category, count in counts.items():
-            if count > 0:
-                hub_composition_data.append({
-                    'hub_id': f"#{top_10_hubs_list.index((hub_id, degree))+1}: {hub_id} ({degree} ЛЕП)",
-                    'Категорія напруги': category,
-                    'Кількість ЛЕП': count
-                })
-                
-    return pd.DataFrame(hub_composition_data)
+    # 1. Рахуємо лінії різної напруги для всіх хабів одним JIT-ядром
+    hub_idx = np.array([bundle.index[hub_id] for hub_id, _ in top_10_hubs_list], dtype=np.int64)
+    hist = _hub_voltage_hist(bundle.indptr, bundle.adj_edge, bundle.edge_cat, hub_idx)
+    
+    # 2. Підпис кожного хаба формуємо один раз (ранг беремо з enumerate)
+    labels = [f"#{rank}: {hub_id} ({degree} ЛЕП)" for rank, (hub_id, degree) in enumerate(top_10_hubs_list, start=1)]
+    counts = pd.DataFrame(hist, index=labels, columns=["380кВ+", "220кВ", "110кВ", "Інше"])
+    
+    # 3. Форматуємо дані для "stacked bar chart" ("довгий" формат, без нульових категорій)
+    hub_composition_df = (counts.stack()
+                          .rename('Кількість ЛЕП')
+                          .rename_axis(['hub_id', 'Категорія напруги'])
+                          .reset_index())
+    return hub_composition_df[hub_composition_df['Кількість ЛЕП'] > 0].reset_index(drop=True)
@@ -1,77 +1,230 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output, State 
+from dash import dcc, html, dash_table, Patch
+from dash.dependencies import Input, Output, State, ClientsideFunction 
 from dash.exceptions import PreventUpdate 
 import pandas as pd
+import numpy as np
+import plotly.io as pio
 import time
-import random 
+import os
+import json
+import pickle
+import hashlib
+import threading
+import gc
+from functools import lru_cache
 
 # ІМПОРТУЄМО НАШІ ФАЙЛИ
 import analysis 
 import plotting_plotly 
 
+try:
+    import orjson
+    # Відповіді Dash серіалізуються через plotly.io.json: явно вмикаємо швидкий orjson
+    pio.json.config.default_engine = 'orjson'
+    json_loads = orjson.loads
+except ImportError:
+    # orjson необов'язковий: стандартний json дає той самий результат, лише повільніше
+    json_loads = json.loads
+
+try:
+    from flask_caching import Cache
+except ImportError:
+    # Flask-Caching необов'язковий: без нього Min-Cut рахується на кожен клік
+    Cache = None
+
 # --- НАЛАШТУВАННЯ ---
 FILE_NAME = "Europa_highvoltage.graphml"
 NODES_TO_ATTACK = 100 
+RANDOM_SEED = 42 # Фіксований seed: випадкова атака однакова між запусками (і кешується)
+# Кеш результатів аналізів на диску (див. ЕТАП 2), окремий файл на кожен аналіз.
+# ANALYSIS_CACHE_VERSION збільшувати при зміні самих аналізів у analysis.py
+ANALYSIS_CACHE_DIR = "cache"
+ANALYSIS_CACHE_VERSION = 9
+# Кеш готових графіків (JSON), ключ - хеш даних (див. ЕТАП 3)
+FIGURE_CACHE_DIR = os.path.join(ANALYSIS_CACHE_DIR, "figures")
+# Гео-мапа: при малому масштабі підстанції агрегуються в сітку (градуси),
+# з GEO_POINTS_MIN_ZOOM - показуються всі окремо і їх можна клікнути
+GEO_CELL_DEG = 1.0
+GEO_POINTS_MIN_ZOOM = 5
 
 # --- ЕТАП 1: ЗАВАНТАЖЕННЯ ДАНИХ ---
 # Цей етап виконується ОДИН РАЗ при запуску програми.
 # ------------------------------------------------
 print(f"Завантажую граф '{FILE_NAME}'...")
 start_time = time.time()
-# G_main робимо глобальною, щоб Callback-и мали до неї доступ
-G_main = analysis.load_and_prepare_data(FILE_NAME)
+# Ключ кешів графа та аналізів: залежить від вмісту файлу, а не від шляху чи часу зміни
+GRAPH_FILE_HASH = analysis.file_digest(FILE_NAME)
+# bundle (граф + його масиви) та G_main робимо глобальними, щоб Callback-и мали до них доступ.
+# Кеш bundle перевіряється тим самим хешем, тож аналізи завжди рахуються з графа цього файлу
+bundle = analysis.load_and_prepare_data(FILE_NAME, GRAPH_FILE_HASH)
+G_main = bundle.G
+# Множина допустимих ID для валідації вводу в Callback-ах (будується з масиву bundle, що вже в кеші)
+VALID_NODE_IDS = frozenset(map(str, bundle.node_ids))
 print(f"Граф завантажено. ({time.time() - start_time:.2f} сек)")
 print("-" * 30)
 
-# --- ЕТАП 2: ПРОВЕДЕННЯ ВСІХ АНАЛІЗІВ ---
-# Виконуємо всі "важкі" розрахунки ОДИН РАЗ при запуску,
-# щоб дашборд завантажувався вже з готовими даними.
+# --- ЕТАП 2: АНАЛІЗИ ---
+# Аналізи рахуються "ліниво": при запуску - лише ті, що потрібні вкладкам
+# "Огляд" та "Аналіз потоків", решта - при першому відкритті своєї вкладки.
+# Кожен результат зберігається на диску, тож наступні запуски
+# (поки файл графа не змінився) просто читають його з кешу.
 # ------------------------------------------------
-print("Проводжу всі аналізи... (це займе ~2-3 хвилини)")
+def compute_degree():
+    """2.1: 'Хаби' та 'Тупики'."""
+    return analysis.get_degree_analysis(bundle)
+
+def compute_centrality():
+    """2.2 - 2.3: Критичність (незважена та зважена)."""
+    return analysis.get_centrality_analysis(bundle), analysis.get_weighted_centrality_analysis(bundle)
+
+def compute_robustness():
+    """2.4 - 2.5: Стійкість (Цільова атака та Випадкова відмова) - одним паралельним викликом."""
+    full_sorted_degree, _ = get_analysis('degree')
+    top_100_hub_ids = full_sorted_degree['id'][:NODES_TO_ATTACK].tolist()
+    rng = np.random.default_rng(RANDOM_SEED)
+    random_idx = rng.choice(len(bundle.node_ids), size=NODES_TO_ATTACK, replace=False)
+    random_nodes_list = bundle.node_ids[random_idx].tolist()
+    return analysis.calculate_robustness_batch(bundle, [top_100_hub_ids, random_nodes_list])
+
+def compute_bottleneck_init():
+    """2.6: 'Вузькі місця' (Потоки) - Розрахунок за замовчуванням (найбільший хаб -> перший тупик)."""
+    full_sorted_degree, vulnerable_nodes_list = get_analysis('degree')
+    return analysis.get_bottleneck_analysis(bundle, full_sorted_degree['id'][0], vulnerable_nodes_list[0])
+
+def compute_communities():
+    """2.7: Спільноти."""
+    return analysis.get_communities_analysis(bundle)
+
+def compute_voltage_map():
+    """2.8: Напруга вузлів для гео-мапи."""
+    return analysis.get_voltage_data_for_nodes(bundle)
+
+def compute_hubs_composition():
+    """2.8: Склад Топ-10 хабів за напругою."""
+    full_sorted_degree, _ = get_analysis('degree')
+    return analysis.get_hubs_voltage_composition(bundle, full_sorted_degree[:10])
+
+def compute_histogram():
+    """2.9: Дані для гістограми."""
+    return analysis.get_histogram_data(bundle)
+
+# Назва аналізу -> функція розрахунку
+ANALYSES = {
+    'degree': compute_degree,
+    'centrality': compute_centrality,
+    'robustness': compute_robustness,
+    'bottleneck_init': compute_bottleneck_init,
+    'communities': compute_communities,
+    'voltage_map': compute_voltage_map,
+    'hubs_composition': compute_hubs_composition,
+    'histogram': compute_histogram,
+}
+
+def load_or_compute_analysis(name):
+    """
+    Повертає результат аналізу з кешу на диску або рахує його заново.
+    Ключ кешу - (назва аналізу, хеш вмісту графа, версія аналізів,
+    NODES_TO_ATTACK, RANDOM_SEED).
+    @param name (str): Назва аналізу з ANALYSES.
+    @return: Результат функції розрахунку.
+    """
+    key = f"{name}|{GRAPH_FILE_HASH}|{ANALYSIS_CACHE_VERSION}|{NODES_TO_ATTACK}|{RANDOM_SEED}"
+    cache_path = os.path.join(ANALYSIS_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".pkl")
+    
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                result = pickle.load(f)
+            print(f"Аналіз '{name}' взято з кешу '{cache_path}'.")
+            return result
+        except Exception as e:
+            # Пошкоджений кеш - просто рахуємо заново
+            print(f"Не вдалося прочитати кеш аналізу '{name}' ({e}), рахую заново...")
+    
+    start_time = time.time()
+    result = ANALYSES[name]()
+    print(f"Аналіз '{name}' завершено. ({time.time() - start_time:.2f} сек)")
+    try:
+        os.makedirs(ANALYSIS_CACHE_DIR, exist_ok=True)
+        analysis.write_file_atomic(cache_path, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        print(f"Не вдалося зберегти кеш аналізу '{name}': {e}")
+    return result
+
+# Callback-и можуть одночасно відкрити ту саму вкладку: другий чекає
+# і читає вже збережений на диску результат замість повторного розрахунку
+_ANALYSIS_LOCK = threading.RLock()
+
+@lru_cache(maxsize=None)
+def get_analysis(name):
+    """
+    Результат аналізу (рахується один раз за процес).
+    @param name (str): Назва аналізу з ANALYSES.
+    @return: Результат функції розрахунку.
+    """
+    with _ANALYSIS_LOCK:
+        return load_or_compute_analysis(name)
+
+# При запуску потрібні лише 'Хаби'/'Тупики', гістограма та потік за замовчуванням
 # 2.1: 'Хаби' та 'Тупики'
-full_sorted_degree, vulnerable_nodes_list = analysis.get_degree_analysis(G_main)
+full_sorted_degree, vulnerable_nodes_list = get_analysis('degree')
 top_10_hubs_list = full_sorted_degree[:10] 
-top_10_hubs_df = pd.DataFrame(top_10_hubs_list, columns=["ID Вузла", "Кількість ЛЕП"]); top_10_hubs_df.index += 1
-top_10_hub_nodes_list = [node[0] for node in top_10_hubs_list]
-top_100_hub_ids = [node[0] for node in full_sorted_degree[:NODES_TO_ATTACK]]
-SOURCE_NODE_ID = top_100_hub_ids[0] # Джерело за замовчуванням
+top_10_hubs_df = pd.DataFrame(top_10_hubs_list).set_axis(["ID Вузла", "Кількість ЛЕП"], axis=1); top_10_hubs_df.index += 1
+SOURCE_NODE_ID = full_sorted_degree['id'][0] # Джерело за замовчуванням
 SINK_NODE_ID = vulnerable_nodes_list[0] # Споживач за замовчуванням
 vulnerable_nodes_df = pd.DataFrame(vulnerable_nodes_list, columns=["ID Тупикового Вузла"])
-# 2.2: Критичність (незважена)
-full_sorted_centrality = analysis.get_centrality_analysis(G_main)
-top_10_centrality_df = pd.DataFrame(full_sorted_centrality[:10], columns=["ID Вузла", "Показник"])
-# 2.3: Критичність (зважена)
-full_sorted_weighted_centrality = analysis.get_weighted_centrality_analysis(G_main)
-top_10_weighted_centrality_df = pd.DataFrame(full_sorted_weighted_centrality[:10], columns=["ID Вузла", "Показник"])
-# 2.4: Стійкість (Цільова атака)
-hub_robustness_df = analysis.calculate_robustness(G_main, top_100_hub_ids)
-# 2.5: Стійкість (Випадкова відмова)
-random_nodes_list = random.sample(list(G_main.nodes()), NODES_TO_ATTACK) 
-rand_robustness_df = analysis.calculate_robustness(G_main, random_nodes_list)
 # 2.6: 'Вузькі місця' (Потоки) - Розрахунок за замовчуванням
-bottleneck_stats_init, bottleneck_df_init = analysis.get_bottleneck_analysis(G_main, SOURCE_NODE_ID, SINK_NODE_ID)
-# 2.7: Спільноти
-communities_df, communities_count = analysis.get_communities_analysis(G_main)
-# 2.8: АНАЛІЗИ НАПРУГИ
-voltage_map_df = analysis.get_voltage_data_for_nodes(G_main)
-hubs_composition_df = analysis.get_hubs_voltage_composition(G_main, top_10_hubs_list)
-print("\n" + "-" * 30); print("Всі аналізи завершено."); print("-" * 30)
+bottleneck_stats_init, bottleneck_df_init = get_analysis('bottleneck_init')
+# 2.9: Гістограма
+hist_data_df = get_analysis('histogram')
+print("-" * 30)
 
 # --- ЕТАП 3: ГЕНЕРАЦІЯ ГРАФІКІВ ---
 # Викликаємо функції з plotting_plotly.py
 # ------------------------------------------------
-print("Генерація інтерактивних графіків:")
+# Як і для графа, кеш графіків залежить від вмісту файлу, а не від часу зміни
+PLOTTING_FILE_HASH = analysis.file_digest(plotting_plotly.__file__)
+
+def build_figure_json(builder, *args):
+    """
+    Будує графік і повертає його JSON-словник, кешуючи результат на диску.
+    Ключ - назва функції, хеш вмісту plotting_plotly.py та хеш вхідних даних,
+    тож при зміні лише одного аналізу решта графіків береться з кешу.
+    @param builder (function): Функція з plotting_plotly.
+    @param args: Аргументи функції (DataFrame-и або прості значення).
+    @return (dict): Графік у вигляді JSON-словника (готовий для dcc.Graph).
+    """
+    key = hashlib.sha1(f"{builder.__name__}|{PLOTTING_FILE_HASH}".encode('utf-8'))
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            key.update(str(list(arg.columns)).encode('utf-8'))
+            key.update(pd.util.hash_pandas_object(arg).to_numpy().tobytes())
+        else:
+            key.update(repr(arg).encode('utf-8'))
+    cache_path = os.path.join(FIGURE_CACHE_DIR, key.hexdigest() + ".json")
+    
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return json_loads(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Не вдалося прочитати кеш графіка ({e}), будую заново...")
+    
+    fig_json = pio.to_json(builder(*args), validate=False)
+    try:
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+        analysis.write_file_atomic(cache_path, fig_json.encode('utf-8'))
+    except Exception as e:
+        print(f"Не вдалося зберегти кеш графіка: {e}")
+    return json_loads(fig_json)
+
+# Графіки одразу серіалізуються в JSON: у лейаут потрапляють готові словники,
+# і Dash не обходить об'єкти go.Figure на кожному завантаженні сторінки.
+# Тут будується лише гістограма (вкладка "Огляд"), решта - у build_*_tab.
 print("  ...будую гістограму...")
-hist_data_df = analysis.get_histogram_data(G_main)
-hist_fig = plotting_plotly.create_histogram_fig(hist_data_df)
-print("  ...будую гео-мапу напруги...")
-geo_fig = plotting_plotly.create_geo_voltage_map(voltage_map_df) 
-print("  ...будую графік стійкості...")
-robustness_fig = plotting_plotly.create_robustness_curve_fig(hub_robustness_df, rand_robustness_df, NODES_TO_ATTACK)
-print("  ...будую графік складу хабів...")
-hubs_composition_fig = plotting_plotly.create_hub_voltage_barchart(hubs_composition_df)
+hist_fig = build_figure_json(plotting_plotly.create_histogram_fig, hist_data_df)
 print(" -> Графіки - ГОТОВО"); print("-" * 30)
 
 # --- ЕТАП 4: СТВОРЕННЯ GUI (Dash) ---
@@ -86,20 +239,38 @@ TABLE_STYLE = {
 LARGE_TABLE_STYLE = TABLE_STYLE.copy()
 LARGE_TABLE_STYLE['style_table'] = {'overflowX': 'auto', 'maxHeight': '400px', 'overflowY': 'auto'}
 
+def table_records(df):
+    """
+    Перетворює DataFrame у список рядків для DataTable.
+    to_json працює на C і помітно швидший за to_dict('records') на великих таблицях.
+    @param df (pd.DataFrame): DataFrame для відображення.
+    @return (list): Список словників {колонка: значення}.
+    """
+    return json_loads(df.to_json(orient='records', force_ascii=False))
+
+@lru_cache(maxsize=32)
+def table_columns(columns):
+    """
+    Опис колонок для DataTable. Схема таблиць фіксована (напр. "Вузькі місця"
+    при кожному розрахунку), тож список будується один раз на набір колонок.
+    Dash лише серіалізує його, тому спільний список безпечний.
+    @param columns (tuple): Назви колонок.
+    @return (list): Список словників {'name', 'id'}.
+    """
+    return [{'name': i, 'id': i} for i in columns]
+
 def format_table(df):
     """
     Форматує DataFrame у DataTable з пагінацією (10 рядків).
     @param df (pd.DataFrame): DataFrame для відображення.
     @return (dash_table.DataTable): Готовий компонент таблиці.
     """
-    df_display = df.copy()
-    # Округляємо float для чистого вигляду
-    for col in df_display.columns:
-        if pd.api.types.is_float_dtype(df_display[col]):
-            df_display[col] = df_display[col].round(6)
+    # Округляємо float для чистого вигляду: один векторний round на всю таблицю
+    # (нечислові колонки pandas пропускає). round вже повертає нову таблицю, тож copy() не потрібен
+    df_display = df.round(6) if df.select_dtypes('float').shape[1] else df
     return dash_table.DataTable(
-        data=df_display.to_dict('records'),
-        columns=[{'name': i, 'id': i} for i in df_display.columns],
+        data=table_records(df_display),
+        columns=table_columns(tuple(df_display.columns)),
         sort_action="native", # Дозволяємо сортування
         page_size=10,         # Пагінація
         **TABLE_STYLE
@@ -111,18 +282,203 @@ def format_large_table(df):
     @param df (pd.DataFrame): DataFrame для відображення (напр., 'Тупики').
     @return (dash_table.DataTable): Готовий компонент таблиці.
     """
-    df_display = df.copy()
     return dash_table.DataTable(
-        data=df_display.to_dict('records'),
-        columns=[{'name': i, 'id': i} for i in df_display.columns],
+        data=table_records(df),
+        columns=table_columns(tuple(df.columns)),
         sort_action="native",
         fixed_rows={'headers': True}, # "Приклеюємо" заголовок при прокрутці
+        virtualization=True,          # Браузер малює лише видимі рядки
+        page_action='none',
         **LARGE_TABLE_STYLE
     )
 
-# Ініціалізація додатку Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY])
+def create_background_manager():
+    """
+    Менеджер фонових Callback-ів Dash: розрахунок Min-Cut виконується
+    на воркерах Celery (якщо задано REDIS_URL; воркер: celery -A app_dash.celery_app worker).
+    Без Celery Callback синхронний: Min-Cut на igraph займає соті частки секунди,
+    а DiskcacheManager запускав би новий процес на кожен клік (дорожче за сам
+    розрахунок) і втрачав би його результат разом з кешем у пам'яті процесу.
+    @return (tuple): (менеджер або None, Celery-додаток або None).
+    """
+    redis_url = os.environ.get('REDIS_URL')
+    if redis_url:
+        try:
+            from celery import Celery
+            celery = Celery(__name__, broker=redis_url, backend=redis_url)
+            print(f"Фонові розрахунки: Celery ({redis_url})")
+            return dash.CeleryManager(celery), celery
+        except ImportError:
+            pass
+    # Звичайний (синхронний) Callback у процесі веб-сервера
+    return None, None
+
+background_callback_manager, celery_app = create_background_manager()
+
+# Ініціалізація додатку Dash.
+# suppress_callback_exceptions: частина компонентів (напр. 'geo-map-graph') з'являється
+# в лейауті лише після відкриття "лінивої" вкладки
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY], background_callback_manager=background_callback_manager,
+                suppress_callback_exceptions=True)
 app.title = "Система моніторингу енергосистеми"
+# WSGI-сервер для запуску кількома процесами: gunicorn --preload app_dash:server
+server = app.server
+
+def create_flow_cache(server):
+    """
+    Створює кеш Flask-Caching для результатів Min-Cut.
+    Використовує Redis (REDIS_URL), а якщо він недоступний - кеш у файлах.
+    @param server (flask.Flask): Flask-сервер додатку Dash.
+    @return (Cache): Кеш або None, якщо Flask-Caching не встановлено.
+    """
+    if Cache is None:
+        return None
+    redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+    try:
+        import redis
+        redis.from_url(redis_url, socket_connect_timeout=1).ping()
+        print(f"Кеш 'вузьких місць': Redis ({redis_url})")
+        return Cache(server, config={'CACHE_TYPE': 'RedisCache', 'CACHE_REDIS_URL': redis_url})
+    except Exception:
+        # Немає пакета redis або сервер не відповідає - кешуємо у файлах
+        print("Кеш 'вузьких місць': файлова система")
+        return Cache(server, config={'CACHE_TYPE': 'FileSystemCache', 'CACHE_DIR': os.path.join(ANALYSIS_CACHE_DIR, 'flow')})
+
+flow_cache = create_flow_cache(app.server)
+
+# Версія графа та аналізів у ключі кешу Min-Cut: кеш (Redis або файли) переживає
+# перезапуск, тож після заміни графа чи зміни аналізів старі результати не повертаються
+FLOW_CACHE_GRAPH_KEY = f"{GRAPH_FILE_HASH}|{ANALYSIS_CACHE_VERSION}"
+
+def bottleneck_for_graph(source_id, sink_id, graph_key):
+    """
+    Min-Cut між двома вузлами (analysis.get_bottleneck_analysis).
+    @param graph_key (str): FLOW_CACHE_GRAPH_KEY - лише частина ключа кешу.
+    @return (dict, pd.DataFrame): KPI та таблиця ЛЕП у розрізі.
+    """
+    return analysis.get_bottleneck_analysis(bundle, source_id, sink_id)
+
+if flow_cache is not None:
+    # Ключ кешу - (source_id, sink_id, graph_key)
+    bottleneck_for_graph = flow_cache.memoize(timeout=86400)(bottleneck_for_graph)
+
+@lru_cache(maxsize=256)
+def cached_bottleneck_analysis(source_id, sink_id):
+    """
+    Min-Cut між двома вузлами для поточного графа.
+    Повторні запити тієї ж пари (source, sink) беруться з пам'яті процесу (LRU, 256 пар)
+    без звернення до Flask-Caching; нові пари - зі спільного кешу або рахуються.
+    Результат спільний для всіх викликів, тож його лише читаємо.
+    @return (dict, pd.DataFrame): KPI та таблиця ЛЕП у розрізі.
+    """
+    return bottleneck_for_graph(source_id, sink_id, FLOW_CACHE_GRAPH_KEY)
+
+# --- Вміст "лінивих" вкладок ---
+# Вкладки 2-6 не входять у початковий лейаут: їхні аналізи рахуються, а таблиці
+# та графіки (особливо гео-мапа) відправляються в браузер лише при першому відкритті.
+
+def build_critical_tab():
+    """Вкладка 2: Критичність."""
+    full_sorted_centrality, full_sorted_weighted_centrality = get_analysis('centrality')
+    top_10_centrality_df = pd.DataFrame(full_sorted_centrality[:10], columns=["ID Вузла", "Показник"])
+    top_10_weighted_centrality_df = pd.DataFrame(full_sorted_weighted_centrality[:10], columns=["ID Вузла", "Показник"])
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H4("🏆 Топ-10 'Топологічних Мостів' (за кількістю ЛЕП)"),
+                format_table(top_10_centrality_df.reset_index(names="Рейтинг"))
+            ], width=6),
+            dbc.Col([
+                html.H4("🏆 Топ-10 'Транзитних Мостів' (за кілометражем)"),
+                format_table(top_10_weighted_centrality_df.reset_index(names="Рейтинг"))
+            ], width=6),
+        ], className="mt-4")
+    ]
+
+def build_hubs_tab():
+    """Вкладка 3: Аналіз хабів."""
+    hubs_composition_fig = build_figure_json(plotting_plotly.create_hub_voltage_barchart, get_analysis('hubs_composition'))
+    return [
+        dbc.Row([
+            dbc.Col([
+                html.H4("🏆 Топ-10 'Хабів' (за кількістю ЛЕП)"),
+                format_table(top_10_hubs_df.reset_index(names="Рейтинг"))
+            ], width=5), 
+            dbc.Col([
+                html.H4(f"🔌 Склад 'Хабів' за напругою"),
+                # Загортаємо графік у Div з фіксованою висотою, щоб він не "розповзався"
+                html.Div(dcc.Graph(figure=hubs_composition_fig, style={'height': '100%'}), style={'height': '500px'})
+            ], width=7), 
+        ], className="mt-4")
+    ]
+
+def build_robustness_tab():
+    """Вкладка 4: Аналіз стійкості."""
+    hub_robustness_df, rand_robustness_df = get_analysis('robustness')
+    robustness_fig = build_figure_json(plotting_plotly.create_robustness_curve_fig, hub_robustness_df, rand_robustness_df, NODES_TO_ATTACK)
+    return [
+        dbc.Row(dbc.Col(html.H4(f"Симуляція видалення {NODES_TO_ATTACK} вузлів"), width=12), className="mt-4"),
+        dbc.Row(dbc.Col(dcc.Graph(figure=robustness_fig), width=12), className="mt-2")
+    ]
+
+def build_communities_tab():
+    """Вкладка 5: Аналіз спільнот."""
+    communities_df, communities_count = get_analysis('communities')
+    return [
+        dbc.Row([
+            dbc.Col(html.H4(f"Алгоритм знайшов {communities_count} спільнот (кластерів)"), width=12),
+            dbc.Col(html.H5("Топ-15 найбільших спільнот:"), width=12, className="mt-3")
+        ], className="mt-4"),
+        dbc.Row(dbc.Col(format_table(communities_df), width=8), className="mt-2")
+    ]
+
+def build_geo_tab():
+    """Вкладка 6: Гео-мапа (напруга)."""
+    # Початковий масштаб - агрегована сітка; окремі вузли підвантажує Callback 4
+    geo_fig = build_figure_json(plotting_plotly.create_geo_voltage_map, get_analysis('voltage_map'), GEO_CELL_DEG)
+    return [
+        dbc.Row(dbc.Col(dcc.Graph(
+            id='geo-map-graph', # ID потрібен для Callback
+            figure=geo_fig, 
+            style={'height': '75vh'} # 75% висоти екрану
+        ), width=12), className="mt-4") 
+    ]
+
+@lru_cache(maxsize=None)
+def geo_trace_data(resolution):
+    """
+    Дані трас гео-мапи для режиму 'cells' (сітка) або 'points' (усі вузли), готові для Patch:
+    координати та розміри маркерів - бінарні typed array (float32), а не JSON-списки чисел.
+    Кодуються один раз на режим.
+    @param resolution (str): 'cells' або 'points'.
+    @return (list): Див. plotting_plotly.get_geo_trace_data.
+    """
+    cell_deg = GEO_CELL_DEG if resolution == 'cells' else None
+    traces = plotting_plotly.get_geo_trace_data(get_analysis('voltage_map'), cell_deg)
+    for trace in traces:
+        trace['lat'] = plotting_plotly.typed_array(trace['lat'])
+        trace['lon'] = plotting_plotly.typed_array(trace['lon'])
+        if isinstance(trace['size'], np.ndarray):
+            trace['size'] = plotting_plotly.typed_array(trace['size'])
+    return traces
+
+# tab_id -> функція, що будує вміст вкладки
+LAZY_TABS = {
+    "tab-critical": build_critical_tab,
+    "tab-hubs": build_hubs_tab,
+    "tab-robustness": build_robustness_tab,
+    "tab-communities": build_communities_tab,
+    "tab-geo": build_geo_tab,
+}
+
+@lru_cache(maxsize=None)
+def build_tab_content(tab_id):
+    """
+    Будує вміст "лінивої" вкладки (разом з її аналізами) один раз - дані статичні.
+    @param tab_id (str): ID вкладки з LAZY_TABS.
+    @return (list): Дочірні компоненти вкладки.
+    """
+    return LAZY_TABS[tab_id]()
 
 # --- ЛЕЙАУТ (СТРУКТУРА) ДОДАТКУ ---
 app.layout = dbc.Container([
@@ -131,12 +487,19 @@ app.layout = dbc.Container([
     
     # Невидимий компонент для збереження ID вузла, обраного на мапі
     dcc.Store(id='map-click-store'),
+    # Пара (Джерело, Споживач), для якої зараз показано результат Min-Cut
+    dcc.Store(id='last-flow-key', data=[SOURCE_NODE_ID, SINK_NODE_ID]),
+    
+    # Список "лінивих" вкладок, вміст яких вже відправлено в браузер
+    dcc.Store(id='loaded-tabs', data=[]),
+    # Поточний режим гео-мапи: 'cells' (агрегована сітка) або 'points'
+    dcc.Store(id='geo-resolution', data='cells'),
     
     # Контейнер з вкладками
-    dbc.Tabs(id="tabs-main", children=[
+    dbc.Tabs(id="tabs-main", active_tab="tab-overview", children=[
         
         # --- ВКЛАДКА 1: ОГЛЯД ---
-        dbc.Tab(label="📊 Загальний огляд", children=[
+        dbc.Tab(label="📊 Загальний огляд", tab_id="tab-overview", children=[
             dbc.Row([
                 dbc.Col(dbc.Card([dbc.CardHeader("Вузли (Підстанції)"), dbc.CardBody(html.H3(f"{G_main.number_of_nodes()}", className="card-title"))], color="primary", outline=True), width=4),
                 dbc.Col(dbc.Card([dbc.CardHeader("Ребра (ЛЕП)"), dbc.CardBody(html.H3(f"{G_main.number_of_edges()}", className="card-title"))], color="primary", outline=True), width=4),
@@ -145,68 +508,23 @@ app.layout = dbc.Container([
             dbc.Row(dbc.Col(dcc.Graph(figure=hist_fig), width=12), className="mt-4")
         ]),
         
-        # --- ВКЛАДКА 2: КРИТИЧНІСТЬ ---
-        dbc.Tab(label="🚨 Аналіз критичності", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H4("🏆 Топ-10 'Топологічних Мостів' (за кількістю ЛЕП)"),
-                    format_table(top_10_centrality_df.reset_index(names="Рейтинг"))
-                ], width=6),
-                dbc.Col([
-                    html.H4("🏆 Топ-10 'Транзитних Мостів' (за кілометражем)"),
-                    format_table(top_10_weighted_centrality_df.reset_index(names="Рейтинг"))
-                ], width=6),
-            ], className="mt-4")
-        ]),
-
-        # --- ВКЛАДКА 3: АНАЛІЗ ХАБІВ ---
-        dbc.Tab(label="📈 Аналіз Хабів", children=[
-            dbc.Row([
-                dbc.Col([
-                    html.H4("🏆 Топ-10 'Хабів' (за кількістю ЛЕП)"),
-                    format_table(top_10_hubs_df.reset_index(names="Рейтинг"))
-                ], width=5), 
-                dbc.Col([
-                    html.H4(f"🔌 Склад 'Хабів' за напругою"),
-                    # Загортаємо графік у Div з фіксованою висотою, щоб він не "розповзався"
-                    html.Div(dcc.Graph(figure=hubs_composition_fig, style={'height': '100%'}), style={'height': '500px'})
-                ], width=7), 
-            ], className="mt-4")
-        ]),
-
-        # --- ВКЛАДКА 4: АНАЛІЗ СТІЙКОСТІ ---
-        dbc.Tab(label="🛡️ Аналіз Стійкості", children=[
-            dbc.Row(dbc.Col(html.H4(f"Симуляція видалення {NODES_TO_ATTACK} вузлів"), width=12), className="mt-4"),
-            dbc.Row(dbc.Col(dcc.Graph(figure=robustness_fig), width=12), className="mt-2")
-        ]),
-
-        # --- ВКЛАДКА 5: АНАЛІЗ СПІЛЬНОТ ---
-        dbc.Tab(label="🌍 Аналіз спільнот", children=[
-            dbc.Row([
-                dbc.Col(html.H4(f"Алгоритм знайшов {communities_count} спільнот (кластерів)"), width=12),
-                dbc.Col(html.H5("Топ-15 найбільших спільнот:"), width=12, className="mt-3")
-            ], className="mt-4"),
-            dbc.Row(dbc.Col(format_table(communities_df), width=8), className="mt-2")
-        ]),
-
-        # --- ВКЛАДКА 6: ГЕО-МАПА (НАПРУГА) ---
-        dbc.Tab(label="🗺️ Гео-мапа (Напруга)", children=[
-            dbc.Row(dbc.Col(dcc.Graph(
-                id='geo-map-graph', # ID потрібен для Callback
-                figure=geo_fig, 
-                style={'height': '75vh'} # 75% висоти екрану
-            ), width=12), className="mt-4") 
-        ]),
+        # --- ВКЛАДКИ 2-6: вміст завантажується при першому відкритті (render_lazy_tab) ---
+        dbc.Tab(label="🚨 Аналіз критичності", tab_id="tab-critical", id="tab-critical", children=[]),
+        dbc.Tab(label="📈 Аналіз Хабів", tab_id="tab-hubs", id="tab-hubs", children=[]),
+        dbc.Tab(label="🛡️ Аналіз Стійкості", tab_id="tab-robustness", id="tab-robustness", children=[]),
+        dbc.Tab(label="🌍 Аналіз спільнот", tab_id="tab-communities", id="tab-communities", children=[]),
+        dbc.Tab(label="🗺️ Гео-мапа (Напруга)", tab_id="tab-geo", id="tab-geo", children=[]),
 
         # --- ВКЛАДКА 7: АНАЛІЗ ПОТОКІВ (ІНТЕРАКТИВНА) ---
-        dbc.Tab(label="🚇 Аналіз потоків", children=[
+        # Будується одразу: клік на мапі записує ID у її поля вводу
+        dbc.Tab(label="🚇 Аналіз потоків", tab_id="tab-flow", children=[
             dbc.Row(dbc.Col(html.H4("Аналіз потоків: 'Вузькі місця' (Min-Cut)"), width=12), className="mt-4"),
             
             # Блок 1: Перемикач для мапи
             dbc.Card(dbc.CardBody([
                 html.Label("Режим вибору на мапі:", className="fw-bold"),
                 dbc.RadioItems(options=[{'label': '⚡ Задати Джерело', 'value': 'source'}, {'label': '🏠 Задати Споживача', 'value': 'sink'}], value='source', id='flow-radio-select', inline=True, className="mt-2"),
-                html.Small("Перейдіть на вкладку 'Гео-мапа (Напруга)' та клікніть на вузол, щоб обрати його.", className="text-muted")
+                html.Small("Перейдіть на вкладку 'Гео-мапа (Напруга)', наблизьте мапу, щоб побачити окремі вузли, та клікніть на вузол, щоб обрати його.", className="text-muted")
             ]), className="mt-3", color="secondary", outline=True),
             
             # Блок 2: Поля вводу та кнопка
@@ -245,28 +563,36 @@ app.layout = dbc.Container([
 # Тут визначається вся інтерактивність дашборду.
 
 @app.callback(
-    Output('map-click-store', 'data'), # ВИХІД: Оновити невидиме сховище
-    Input('geo-map-graph', 'clickData'), # ВХІД: Слідкувати за кліком на мапі
-    prevent_initial_call=True # Не запускати при завантаженні
+    *[Output(tab_id, 'children') for tab_id in LAZY_TABS], # ВИХІД: Вміст "лінивих" вкладок
+    Output('loaded-tabs', 'data'),       # ВИХІД: Оновлений список завантажених вкладок
+    Input('tabs-main', 'active_tab'),    # ВХІД: Перемикання вкладки
+    State('loaded-tabs', 'data'),        # СТАН: Вкладки, що вже в браузері
 )
-def store_map_click(clickData):
+def render_lazy_tab(active_tab, loaded_tabs):
     """
-    Callback 1: "Ловить" клік на мапі ('geo-map-graph').
-    Витягує ID вузла з 'customdata' та зберігає його у
-    невидиме сховище ('map-click-store').
+    Callback 0: Заповнює вкладку 2-6 при її першому відкритті.
+    Вже завантажені вкладки не надсилаються повторно (і зберігають свій стан,
+    напр. масштаб мапи).
     """
-    if not clickData: 
-        raise PreventUpdate
-    try:
-        # 'customdata[0]' містить ID, який ми передали в plotting_plotly.py
-        node_id = clickData['points'][0]['customdata'][0]
-        print(f"...CALLBACK (Map): Клікнуто вузол {node_id}")
-        return node_id
-    except (KeyError, IndexError, TypeError):
-        print("...CALLBACK (Map): Клік не розпізнано.")
+    loaded_tabs = loaded_tabs or []
+    if active_tab not in LAZY_TABS or active_tab in loaded_tabs:
         raise PreventUpdate
+    
+    outputs = [dash.no_update] * len(LAZY_TABS)
+    outputs[list(LAZY_TABS).index(active_tab)] = build_tab_content(active_tab)
+    return *outputs, loaded_tabs + [active_tab]
 
-@app.callback(
+# Callback-и 1 та 2 (вибір вузла на мапі) лише перекладають дані між компонентами,
+# тому виконуються в браузері: assets/clientside.js, без запитів до сервера.
+app.clientside_callback(
+    ClientsideFunction(namespace='flow', function_name='store_map_click'),
+    Output('map-click-store', 'data'), # ВИХІД: Оновити невидиме сховище
+    Input('geo-map-graph', 'clickData'), # ВХІД: Слідкувати за кліком на мапі
+    prevent_initial_call=True # Не запускати при завантаженні
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='flow', function_name='update_inputs_from_map'),
     Output('input-source', 'value'), # ВИХІД: Оновити поле "Джерело"
     Output('input-sink', 'value'),   # ВИХІД: Оновити поле "Споживач"
     Input('map-click-store', 'data'), # ВХІД: Слідкувати за змінами у сховищі
@@ -275,24 +601,6 @@ def store_map_click(clickData):
     State('input-sink', 'value'),   # СТАН: Взяти поточне значення "Споживача"
     prevent_initial_call=True
 )
-def update_inputs_from_map(clicked_node_id, radio_choice, current_source, current_sink):
-    """
-    Callback 2: "Слухає" невидиме сховище.
-    Коли 'map-click-store' оновлюється (після кліку на мапі),
-    ця функція перевіряє перемикач ('flow-radio-select') і 
-    вставляє новий ID у правильне поле ('input-source' або 'input-sink').
-    """
-    if not clicked_node_id:
-        raise PreventUpdate
-    
-    if radio_choice == 'source':
-        print(f"...CALLBACK (Store): Встановлено Джерело = {clicked_node_id}")
-        return clicked_node_id, current_sink # Оновити Джерело, залишити Споживача
-    elif radio_choice == 'sink':
-        print(f"...CALLBACK (Store): Встановлено Споживача = {clicked_node_id}")
-        return current_source, clicked_node_id # Залишити Джерело, оновити Споживача
-    
-    return current_source, current_sink # На випадок, якщо щось піде не так
 
 @app.callback(
     Output('output-bottleneck-table', 'children'), # ВИХІД: Таблиця результатів
@@ -300,57 +608,108 @@ def update_inputs_from_map(clicked_node_id, radio_choice, current_source, curren
     Output('kpi-line-count', 'children'),        # ВИХІД: KPI 1
     Output('kpi-min-voltage', 'children'),       # ВИХІД: KPI 2
     Output('kpi-cut-value', 'children'),         # ВИХІД: KPI 3
+    Output('last-flow-key', 'data'),             # ВИХІД: Пара, для якої показано результат
     Input('button-calculate-flow', 'n_clicks'),  # ВХІД: Клік на кнопку
     State('input-source', 'value'),              # СТАН: Взяти ID Джерела
     State('input-sink', 'value'),                # СТАН: Взяти ID Споживача
+    State('last-flow-key', 'data'),              # СТАН: Пара з попереднього розрахунку
+    background=background_callback_manager is not None, # Рахуємо у фоні, якщо є менеджер
+    running=[(Output('button-calculate-flow', 'disabled'), True, False)], # Блокуємо кнопку на час розрахунку
     prevent_initial_call=True 
 )
-def update_bottleneck_analysis(n_clicks, source_id, sink_id):
+def update_bottleneck_analysis(n_clicks, source_id, sink_id, last_key):
     """
     Callback 3: Головний розрахунковий Callback.
     Активується при натисканні кнопки 'button-calculate-flow'.
     Бере ID з полів вводу, викликає 'analysis.get_bottleneck_analysis'
     і оновлює всі 3 виходи: Таблицю, KPI-картки та Повідомлення про помилку.
+    Якщо пара (source, sink) та сама, що й у показаному результаті,
+    нічого не перераховує і не перемальовує.
     """
     
     # 1. Валідація (перевірка) введених даних
-    no_update = (dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update) 
+    # Нормалізуємо ввід: dbc.Input може повернути ID з пробілами
+    source_id = str(source_id).strip() if source_id is not None else ""
+    sink_id = str(sink_id).strip() if sink_id is not None else ""
     
     if not source_id or not sink_id:
         alert = dbc.Alert("Будь ласка, введіть ID для Джерела та Споживача.", color="danger")
-        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update
-    if source_id not in G_main.nodes:
+        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    if source_id not in VALID_NODE_IDS:
         alert = dbc.Alert(f"Помилка: ID Джерела '{source_id}' не знайдено в графі.", color="danger")
-        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update
-    if sink_id not in G_main.nodes:
+        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    if sink_id not in VALID_NODE_IDS:
         alert = dbc.Alert(f"Помилка: ID Споживача '{sink_id}' не знайдено в графі.", color="danger")
-        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update, dash.no_update
     if source_id == sink_id:
         alert = dbc.Alert("Джерело та Споживач не можуть бути однаковими.", color="danger")
-        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    
+    # Та сама пара - таблиця та KPI вже актуальні, лише прибираємо старе повідомлення про помилку
+    if last_key == [source_id, sink_id]:
+        return dash.no_update, None, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
     # 2. Розрахунок (викликаємо 'analysis.py')
     print(f"...CALLBACK (Button): Розрахунок нового 'вузького місця': {source_id} -> {sink_id}")
     start_time = time.time()
     try:
-        new_stats, new_bottleneck_df = analysis.get_bottleneck_analysis(G_main, source_id, sink_id)
+        new_stats, new_bottleneck_df = cached_bottleneck_analysis(source_id, sink_id)
         print(f"...CALLBACK (Button): Розрахунок завершено за {time.time() - start_time:.2f} сек.")
     except Exception as e:
         # Обробка помилок NetworkX (напр., немає шляху між вузлами)
         print(f"...CALLBACK (Button): ПОМИЛКА - {e}")
         alert = dbc.Alert(f"Помилка розрахунку: {e}. Можливо, між вузлами немає шляху.", color="danger")
-        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update
+        return dash.no_update, alert, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-    # 3. Повертаємо результати для оновлення 5 компонентів
+    # 3. Повертаємо результати для оновлення 6 компонентів
     new_table = format_table(new_bottleneck_df)
     kpi1_count = f"{new_stats['line_count']}"
     kpi2_voltage = f"{new_stats['min_voltage_str']}"
     kpi3_capacity = f"{new_stats['cut_value_str']}"
     
-    return new_table, None, kpi1_count, kpi2_voltage, kpi3_capacity 
+    return new_table, None, kpi1_count, kpi2_voltage, kpi3_capacity, [source_id, sink_id]
+
+@app.callback(
+    Output('geo-map-graph', 'figure'),         # ВИХІД: Дані трас мапи (частково, через Patch)
+    Output('geo-resolution', 'data'),          # ВИХІД: Новий режим мапи
+    Input('geo-map-graph', 'relayoutData'),    # ВХІД: Зміна масштабу/позиції мапи
+    State('geo-resolution', 'data'),           # СТАН: Поточний режим мапи
+    prevent_initial_call=True
+)
+def update_geo_resolution(relayout_data, resolution):
+    """
+    Callback 4: Перемикає гео-мапу між агрегованою сіткою та окремими вузлами,
+    коли масштаб перетинає GEO_POINTS_MIN_ZOOM.
+    Через Patch надсилаються лише координати, customdata, розміри маркерів та шаблон підказки;
+    решта фігури (і позиція мапи, завдяки uirevision) лишається в браузері.
+    """
+    zoom = (relayout_data or {}).get('map.zoom')
+    if zoom is None:
+        raise PreventUpdate
+    new_resolution = 'points' if zoom >= GEO_POINTS_MIN_ZOOM else 'cells'
+    if new_resolution == resolution:
+        raise PreventUpdate
+    
+    patched_fig = Patch()
+    for i, trace in enumerate(geo_trace_data(new_resolution)):
+        patched_fig['data'][i]['lat'] = trace['lat']
+        patched_fig['data'][i]['lon'] = trace['lon']
+        patched_fig['data'][i]['customdata'] = trace['customdata']
+        patched_fig['data'][i]['marker']['size'] = trace['size']
+        patched_fig['data'][i]['hovertemplate'] = trace['hovertemplate']
+    return patched_fig, new_resolution
 
 
 # --- ЕТАП 6: ЗАПУСК GUI ---
+# Для кількох воркерів (gunicorn --preload) з PRELOAD_ANALYSES=1 усі аналізи рахуються
+# в головному процесі до fork: воркери не повторюють розрахунків, а граф і результати
+# лежать у спільних (copy-on-write) сторінках пам'яті. gc.freeze() прибирає вже створені
+# об'єкти з поля зору збирача сміття, щоб його обходи не копіювали ці сторінки у кожен воркер.
+if os.environ.get("PRELOAD_ANALYSES") == "1":
+    for name in ANALYSES:
+        get_analysis(name)
+    gc.freeze()
+
 if __name__ == '__main__':
     print("-" * 30)
     print("Всі розрахунки завершено. Запускаю Dash-сервер...")
@@ -0,0 +1,42 @@
+// Clientside Callback-и дашборду (app_dash.py).
+// Виконуються прямо в браузері: вибір вузла на мапі не потребує запиту до сервера.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    flow: {
+        /**
+         * Callback 1: "Ловить" клік на мапі ('geo-map-graph') і повертає ID вузла
+         * для невидимого сховища ('map-click-store').
+         * 'customdata[0]' містить ID, який ми передали в plotting_plotly.py
+         * (у комірок агрегованої сітки ID порожній - такий клік ігнорується)
+         */
+        store_map_click: function (clickData) {
+            let nodeId = null;
+            try {
+                nodeId = clickData.points[0].customdata[0];
+            } catch (e) {
+                // Клік не розпізнано
+            }
+            if (!nodeId) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return nodeId;
+        },
+
+        /**
+         * Callback 2: Вставляє ID зі сховища у поле "Джерело" або "Споживач"
+         * залежно від перемикача ('flow-radio-select').
+         */
+        update_inputs_from_map: function (clickedNodeId, radioChoice, currentSource, currentSink) {
+            if (!clickedNodeId) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            if (radioChoice === 'source') {
+                return [clickedNodeId, currentSink]; // Оновити Джерело, залишити Споживача
+            }
+            if (radioChoice === 'sink') {
+                return [currentSource, clickedNodeId]; // Залишити Джерело, оновити Споживача
+            }
+            return [currentSource, currentSink]; // На випадок, якщо щось піде не так
+        }
+    }
+});
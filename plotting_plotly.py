@@ -1,6 +1,7 @@
+import base64
 import plotly.graph_objects as go
 import plotly.express as px
-import pandas as pd
+import numpy as np
 
 PLOTLY_TEMPLATE = "plotly_dark" 
 
@@ -36,21 +37,18 @@ def create_robustness_curve_fig(hub_df, rand_df, nodes_to_attack_count):
     @return (go.Figure): Готовий об'єкт графіка Plotly.
     """
     
-    # Об'єднуємо два DataFrame для легкого малювання (Plotly любить "довгий" формат)
-    hub_df['Тип атаки'] = f"Цільова (Топ-{nodes_to_attack_count} Хабів)"
-    rand_df['Тип атаки'] = f"Випадкова ({nodes_to_attack_count} вузлів)"
-    combined_df = pd.concat([hub_df, rand_df])
-    
-    fig = px.line(combined_df, 
-                  x='Крок атаки', 
-                  y='Розмір мережі (%)', 
-                  color='Тип атаки', # Це створить 2 лінії з легендою
-                  title='Крива надійності мережі',
-                  template=PLOTLY_TEMPLATE,
-                  color_discrete_map={ # Кастомні кольори
-                      f"Цільова (Топ-{nodes_to_attack_count} Хабів)": 'red',
-                      f"Випадкова ({nodes_to_attack_count} вузлів)": '#5DADE2'
-                  })
+    # Дві лінії будуємо напряму з колонок: без pd.concat і без зміни вхідних DataFrame
+    # (вони можуть бути кешованими результатами аналізу)
+    curves = [
+        (hub_df, f"Цільова (Топ-{nodes_to_attack_count} Хабів)", 'red'),
+        (rand_df, f"Випадкова ({nodes_to_attack_count} вузлів)", '#5DADE2'), # Кастомні кольори
+    ]
+    fig = go.Figure([go.Scatter(x=df['Крок атаки'].to_numpy(), y=df['Розмір мережі (%)'].to_numpy(),
+                                mode='lines', name=name, legendgroup=name, line=dict(color=color))
+                     for df, name, color in curves])
+    fig.update_layout(title='Крива надійності мережі',
+                      template=PLOTLY_TEMPLATE,
+                      legend_title_text='Тип атаки')
     
     fig.update_layout(xaxis_title="Кількість видалених вузлів",
                       yaxis_title="% 'живої' мережі",
@@ -61,44 +59,102 @@ def create_robustness_curve_fig(hub_df, rand_df, nodes_to_attack_count):
     fig.update_traces(hovertemplate='Крок %{x}: <b>%{y:.2f}%</b>')
     return fig
 
-def create_geo_voltage_map(voltage_df):
+# Порядок та кольори категорій напруги на гео-мапі
+GEO_CATEGORY_ORDER = ["380кВ+", "220кВ", "110кВ", "Інше (<110кВ)"]
+GEO_COLOR_MAP = {
+    "380кВ+": "red",
+    "220кВ": "orange",
+    "110кВ": "yellow",
+    "Інше (<110кВ)": "gray"
+}
+
+# Підказки гео-мапи: для вузла - з customdata [id, кВ] та координат, для комірки - готовий рядок
+GEO_POINT_HOVER = 'ID: %{customdata[0]}<br>Max V: %{customdata[1]}кВ<br>Lat: %{lat:.4f}<br>Lon: %{lon:.4f}'
+GEO_CELL_HOVER = '%{customdata[1]}'
+
+# dtype numpy -> dtype typed array Plotly
+_TYPED_ARRAY_DTYPES = {np.dtype(np.float32): 'f4', np.dtype(np.float64): 'f8', np.dtype(np.int16): 'i2', np.dtype(np.int32): 'i4'}
+
+def typed_array(values):
     """
-    Малює інтерактивну гео-мапу, розфарбовану за напругою.
+    Числовий масив у форматі typed array Plotly ({'dtype', 'bdata'}): base64 замість
+    JSON-списку чисел. Потрібен для даних, що йдуть у браузер в обхід go.Figure
+    (напр. через Patch), бо саме go.Figure кодує масиви numpy так автоматично.
     
-    @param voltage_df (pd.DataFrame): DataFrame з [lat, lon, text, category, id].
-    @return (go.Figure): Готовий об'єкт графіка Plotly Mapbox.
+    @param values (np.ndarray): Одновимірний масив (float32/float64/int16/int32).
+    @return (dict): {'dtype': ..., 'bdata': ...}.
     """
-    
-    # Визначаємо порядок та кольори
-    category_order = ["380кВ+", "220кВ", "110кВ", "Інше (<110кВ)"]
-    color_map = {
-        "380кВ+": "red",
-        "220кВ": "orange",
-        "110кВ": "yellow",
-        "Інше (<110кВ)": "gray"
-    }
-    
-    fig = px.scatter_mapbox(voltage_df,
-                            lat='lat',
-                            lon='lon',
-                            color='category', # Розфарбовуємо за категорією
-                            category_orders={'category': category_order}, # Встановлюємо порядок
-                            color_discrete_map=color_map, # Встановлюємо кольори
-                            custom_data=['id', 'text'], 
-                            title='Гео-мапа підстанцій (за макс. напругою)',
-                            template=PLOTLY_TEMPLATE,
-                            zoom=3,
-                            center=dict(lat=48.0, lon=15.0)
-                           )
-    
+    arr = np.ascontiguousarray(values)
+    return {'dtype': _TYPED_ARRAY_DTYPES[arr.dtype], 'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+def get_geo_trace_data(voltage_df, cell_deg=None):
+    """
+    Дані трас гео-мапи: по одній на кожну непорожню категорію (у порядку GEO_CATEGORY_ORDER).
+    З cell_deg підстанції кожної категорії агрегуються в сітку lat/lon:
+    один маркер на комірку (у середній точці її вузлів), розмір - за кількістю вузлів.
+    Порядок та кількість трас однакові в обох режимах, тож їх можна підміняти через Patch.
+    
+    @param voltage_df (pd.DataFrame): DataFrame з [lat, lon, max_kv, category, id].
+    @param cell_deg (float): Розмір комірки сітки в градусах; None - кожна підстанція окремо.
+    @return (list): Словники {name, lat, lon, customdata, size, hovertemplate} для кожної траси.
+    """
+    categories = voltage_df['category'].to_numpy()
+    lat = voltage_df['lat'].to_numpy(np.float32)
+    lon = voltage_df['lon'].to_numpy(np.float32)
+    # customdata: [id, кВ] - "чистий" ID потрібен Callback-у кліку на мапі
+    customdata = np.column_stack([voltage_df['id'].to_numpy(dtype=object), voltage_df['max_kv'].to_numpy(dtype=object)])
+    
+    traces = []
+    for category in GEO_CATEGORY_ORDER:
+        mask = categories == category
+        if not mask.any():
+            continue
+        if cell_deg is None:
+            traces.append(dict(name=category, lat=lat[mask], lon=lon[mask],
+                               customdata=customdata[mask], size=4, hovertemplate=GEO_POINT_HOVER))
+            continue
+        
+        # Номер комірки сітки для кожного вузла категорії
+        cells = np.floor(np.column_stack([lat[mask], lon[mask]]) / cell_deg).astype(np.int32)
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        cell_lat = np.bincount(inverse, weights=lat[mask]) / counts
+        cell_lon = np.bincount(inverse, weights=lon[mask]) / counts
+        # ID порожній: клік по комірці не обирає вузол (див. assets/clientside.js)
+        cell_text = [f"{category}: {count} підстанцій<br>Наблизьте мапу, щоб обрати вузол" for count in counts]
+        traces.append(dict(name=category, lat=cell_lat.astype(np.float32), lon=cell_lon.astype(np.float32),
+                           customdata=np.column_stack([np.full(len(counts), None, dtype=object), np.array(cell_text, dtype=object)]),
+                           size=np.clip(3 + np.sqrt(counts), 4, 14).astype(np.float32), hovertemplate=GEO_CELL_HOVER))
+    return traces
+
+def create_geo_voltage_map(voltage_df, cell_deg=None):
+    """
+    Малює інтерактивну гео-мапу, розфарбовану за напругою.
+    Scattermap (MapLibre) малює точки через WebGL, тож ~10 тис. підстанцій
+    відображаються без агрегації, і кожну можна клікнути.
+    З cell_deg мапа спершу показує агреговану сітку (див. get_geo_trace_data) -
+    у кілька разів менше маркерів при початковому масштабі.
+    
+    @param voltage_df (pd.DataFrame): DataFrame з [lat, lon, max_kv, category, id].
+    @param cell_deg (float): Розмір комірки сітки в градусах або None.
+    @return (go.Figure): Готовий об'єкт графіка Plotly Map.
+    """
+    traces = [go.Scattermap(
+        lat=trace['lat'], lon=trace['lon'], customdata=trace['customdata'],
+        mode='markers', name=trace['name'], legendgroup=trace['name'], showlegend=True,
+        marker=dict(color=GEO_COLOR_MAP[trace['name']], size=trace['size'], opacity=0.5),
+        hovertemplate=trace['hovertemplate'] # Що показувати при наведенні
+    ) for trace in get_geo_trace_data(voltage_df, cell_deg)]
+    
+    fig = go.Figure(data=traces)
     fig.update_layout(
-        mapbox_style="carto-darkmatter", # Темний стиль мапи
-        legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+        title='Гео-мапа підстанцій (за макс. напругою)',
+        template=PLOTLY_TEMPLATE,
+        map=dict(style="carto-darkmatter", # Темний стиль мапи
+                 zoom=3, center=dict(lat=48.0, lon=15.0)),
+        legend=dict(title_text='category', tracegroupgap=0, yanchor="top", y=0.99, xanchor="left", x=0.01),
+        uirevision='geo-voltage-map' # Зберігаємо масштаб/позицію мапи при оновленнях фігури
     )
-    
-    # Оновлюємо, ЩО показувати при наведенні
-    fig.update_traces(marker=dict(size=4, opacity=0.5), 
-                      hovertemplate='%{customdata[1]}') 
     return fig
 
 def create_hub_voltage_barchart(hubs_composition_df):